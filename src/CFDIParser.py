@@ -0,0 +1,117 @@
+import re
+import xml.etree.ElementTree as ET
+
+from FieldExtraction import NIV_PATTERN, niv_is_valid
+
+MOTOR_PATTERN = re.compile(r"MOTOR\s*(?:NO\.?|N[ÚU]M(?:ERO)?\.?)?\s*[:.]?\s*([A-Z0-9-]{5,})")
+
+
+def _local_name(tag):
+    """
+    Strips the namespace of an element tag, so CFDI 3.3 and 4.0 are read alike.
+    """
+    return tag.rsplit("}", 1)[-1]
+
+
+def _alphanumeric(text):
+    return re.sub(r"[^0-9A-Z]", "", text.upper())
+
+
+def parse_cfdi(xml_path):
+    """
+    Reads a CFDI (factura XML) with a streaming parser and returns its data with the
+    keys of `FacturaDataExtractor`. Each element is cleared once read, so the memory
+    used does not grow with the size of the file.
+
+    The emisor, receptor, dates and timbre come from the structured nodes. The NIV and
+    motor number come from the vehicle complements (ventavehiculos, vehiculousado) or,
+    failing that, from the concepto description.
+
+    Args:
+        xml_path (str): Path to the XML file.
+
+    Returns:
+        dict or None: Factura fields found in the XML, or None if the file is not a CFDI.
+    """
+    datos = {}
+    descripciones = []
+    try:
+        for _, element in ET.iterparse(xml_path, events=("end",)):
+            name = _local_name(element.tag)
+            attrib = element.attrib
+            fields = {}
+            if name == "Comprobante":
+                fields = {"Fecha Expedición": "Fecha"}
+            elif name == "Emisor":
+                fields = {"RFC Emisor": "Rfc", "Nombre Emisor": "Nombre"}
+            elif name == "Receptor":
+                fields = {"RFC Receptor": "Rfc", "Nombre del solicitante": "Nombre"}
+            elif name == "Concepto":
+                descripciones.append(attrib.get("Descripcion", ""))
+            elif name == "TimbreFiscalDigital":
+                fields = {"Folio Fiscal": "UUID", "Fecha Certificación": "FechaTimbrado"}
+                datos["Cadena original del complemento de certificación digital del SAT"] = "||{}|{}|{}|{}|{}|{}||".format(
+                    attrib.get("Version", ""), attrib.get("UUID", ""), attrib.get("FechaTimbrado", ""),
+                    attrib.get("RfcProvCertif", ""), attrib.get("SelloCFD", ""), attrib.get("NoCertificadoSAT", ""),
+                )
+            elif name == "VentaVehiculos":
+                fields = {"NIV": "Niv"}
+            elif name == "VehiculoUsado":
+                fields = {"NIV": "NIV", "Número de motor": "NumeroMotor", "Marca": "Marca", "Modelo": "Tipo", "Año": "Modelo"}
+
+            for key, attribute in fields.items():
+                if attrib.get(attribute):
+                    datos.setdefault(key, attrib[attribute])
+            element.clear()
+    except ET.ParseError:
+        return None
+
+    if "Folio Fiscal" not in datos and "RFC Emisor" not in datos:
+        return None
+
+    descripcion = " ".join(descripciones).upper()
+    if "NIV" not in datos:
+        nivs = {niv for niv in NIV_PATTERN.findall(descripcion) if niv_is_valid(niv)}
+        if len(nivs) == 1:
+            datos["NIV"] = nivs.pop()
+    if "Número de motor" not in datos:
+        motor = MOTOR_PATTERN.search(descripcion)
+        if motor:
+            datos["Número de motor"] = motor.group(1)
+    return datos
+
+
+def cfdi_matches(datos, texto):
+    """
+    Checks that the Folio Fiscal (UUID) of a CFDI appears in the text of the factura,
+    ignoring hyphens, spaces and case, so the XML of another sale is never merged into
+    the factura of the case.
+
+    Args:
+        datos (dict): Factura fields read from the XML.
+        texto (str): Text of the factura.
+
+    Returns:
+        bool: True if the UUID is found in the text.
+    """
+    uuid = _alphanumeric(datos.get("Folio Fiscal", ""))
+    return bool(uuid) and uuid in _alphanumeric(texto or "")
+
+
+def find_cfdi(paths, texto):
+    """
+    Parses the XML files of a case and returns the CFDI of its factura.
+
+    Args:
+        paths (list of str): Paths to the XML files.
+        texto (str): Text of the factura.
+
+    Returns:
+        dict or None: Factura fields of the first CFDI whose Folio Fiscal appears in
+        the factura, or None if no XML belongs to it.
+    """
+    for path in paths:
+        datos = parse_cfdi(path)
+        if datos and cfdi_matches(datos, texto):
+            return datos
+    return None
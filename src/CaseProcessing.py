@@ -0,0 +1,309 @@
+import os
+import time
+import queue
+import threading
+import multiprocessing
+
+from OCR import TextExtractor, create_ocr_engine
+from OCRCache import get_ocr_cache
+from TextLayer import TextLayerExtractor
+from LayoutFingerprint import get_layout_index, page_fingerprint
+from DocumentClassification import DocumentClassifier
+
+
+# Resolution of the full OCR pass and of the cheap pass used only to classify
+FULL_DPI = 200
+PREVIEW_DPI = int(os.getenv("OCR_PREVIEW_DPI", "100"))
+
+# Document types whose text is sent to a data extractor and therefore needs full OCR
+TEXT_REQUIRED_TYPES = {"FACTURA", "FACTURA REVERSO", "INE", "INE REVERSO", "TARJETA CIRCULACION"}
+
+# Per-thread state, so each worker loads the OCR engine only once and the reviewers'
+# sessions and the background extraction threads never wait for each other's pages
+_engines = threading.local()
+
+
+def _init_worker():
+    """
+    Loads the text-layer reader and the OCR engine of the current thread.
+    """
+    if getattr(_engines, "text_layer_extractor", None) is None:
+        _engines.text_layer_extractor = TextLayerExtractor()
+    if getattr(_engines, "text_extractor", None) is None:
+        _engines.text_extractor = TextExtractor(engine=create_ocr_engine(), cache=get_ocr_cache())
+
+
+def _staged_ocr_enabled():
+    return os.getenv("STAGED_OCR", "1") != "0"
+
+
+def _document_result(pdf_path, results, text_level="full"):
+    """
+    Classifies a document from its text and builds the result entry.
+    """
+    document_classifier = DocumentClassifier(pdf_path, results)
+    new_file_name, document = document_classifier.classify()
+    return {
+        "type": document,
+        "new_name": new_file_name,
+        "text": results,
+        "text_level": text_level,
+        "confidence": document_classifier.confidence,
+        "error": None,
+    }
+
+
+def _layout_result(pdf_path, doc_type, confidence):
+    """
+    Builds the result entry of a document recognized by its page layout. It has no
+    text yet; `ensure_full_text` OCRs it only if a data extractor needs it.
+    """
+    new_file_name, document = DocumentClassifier(pdf_path, [])._build_output(doc_type)
+    return {"type": document, "new_name": new_file_name, "text": [], "text_level": "preview", "confidence": confidence, "error": None}
+
+
+def _match_layouts(pdf_paths):
+    """
+    Classifies scanned pages by their layout fingerprint, without OCR.
+
+    Returns:
+        tuple: (dict mapping matched PDF paths to result entries, list of unmatched paths).
+    """
+    layout_index = get_layout_index()
+    if layout_index is None:
+        return {}, list(pdf_paths)
+
+    matched, unmatched = {}, []
+    for pdf_path in pdf_paths:
+        try:
+            doc_type, confidence = layout_index.match(page_fingerprint(pdf_path))
+        except Exception:
+            doc_type = None
+        if doc_type is None:
+            unmatched.append(pdf_path)
+        else:
+            matched[pdf_path] = _layout_result(pdf_path, doc_type, confidence)
+    return matched, unmatched
+
+
+def _error_result(pdf_path, message):
+    """
+    Builds the result entry of a document that could not be processed.
+    """
+    new_file_name, document = DocumentClassifier(pdf_path, []).classify()
+    return {"type": document, "new_name": new_file_name, "text": [], "text_level": "full", "confidence": 0.0, "error": message}
+
+
+def _ocr_pages(pdf_paths, dpi):
+    """
+    OCRs the first page of each PDF in one batch call.
+
+    Returns:
+        dict: Maps each PDF path to its text lines, or to the exception raised for it.
+    """
+    texts = {}
+    if not pdf_paths:
+        return texts
+    text_extractor = _engines.text_extractor
+    try:
+        pages = [text_extractor.render_page(pdf_path, dpi=dpi) for pdf_path in pdf_paths]
+        texts.update(zip(pdf_paths, text_extractor.images_to_text(pages)))
+    except Exception:
+        # Retry page by page so a single bad document does not fail the whole case
+        for pdf_path in pdf_paths:
+            try:
+                texts[pdf_path] = text_extractor.image_to_text(text_extractor.render_page(pdf_path, dpi=dpi))
+            except Exception as e:
+                texts[pdf_path] = e
+    return texts
+
+
+def _classify_sequential(pdf_paths, staged):
+    """
+    Classifies the documents in the current process, OCRing the scanned pages in batches.
+
+    In staged mode scanned pages whose layout matches a known document (see
+    LayoutFingerprint.py) are classified without OCR, and the remaining ones are first
+    OCRed at PREVIEW_DPI, which is enough to find the anchor phrases used by the
+    classifier. Only documents that cannot be classified from that pass get
+    full-resolution OCR here; the rest get it later, and only if their text is needed
+    (see `ensure_full_text`).
+    """
+    _init_worker()
+    classified = {}
+    scanned_paths = []
+    for pdf_path in pdf_paths:
+        try:
+            # Digitally generated PDFs already carry their text; only scans go through OCR
+            results = _engines.text_layer_extractor.extract(pdf_path)
+        except Exception as e:
+            classified[pdf_path] = _error_result(pdf_path, f"Error al procesar el documento: {e}")
+            continue
+        if results is None:
+            scanned_paths.append(pdf_path)
+        else:
+            classified[pdf_path] = _document_result(pdf_path, results)
+
+    full_ocr_paths = scanned_paths
+    if staged:
+        matched, scanned_paths = _match_layouts(scanned_paths)
+        classified.update(matched)
+        full_ocr_paths = []
+        for pdf_path, results in _ocr_pages(scanned_paths, PREVIEW_DPI).items():
+            if isinstance(results, Exception):
+                full_ocr_paths.append(pdf_path)
+                continue
+            result = _document_result(pdf_path, results, text_level="preview")
+            if result["type"] == "REVISAR":
+                full_ocr_paths.append(pdf_path)
+            else:
+                classified[pdf_path] = result
+
+    for pdf_path, results in _ocr_pages(full_ocr_paths, FULL_DPI).items():
+        if isinstance(results, Exception):
+            classified[pdf_path] = _error_result(pdf_path, f"Error al procesar el documento: {results}")
+        else:
+            classified[pdf_path] = _document_result(pdf_path, results)
+    return classified
+
+
+def classify_document(pdf_path, staged=False):
+    """
+    Extracts the text of a single PDF (text layer or OCR) and classifies it.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        staged (bool): Classify from a low-resolution OCR pass when possible.
+
+    Returns:
+        dict: Result entry with keys 'type', 'new_name', 'text', 'text_level', 'confidence' and 'error'.
+    """
+    return _classify_sequential([pdf_path], staged)[pdf_path]
+
+
+def _classify_parallel(pdf_paths, max_workers, timeout, staged):
+    """
+    Classifies the documents on a process pool of the case, at most `max_workers` at a
+    time, so each one starts when it is sent and gets `timeout` seconds from then. A
+    document that runs out is reported as failed and the pool is terminated, ending
+    its worker; the documents that were running with it are sent again once.
+    """
+    classified = {}
+    pending = list(pdf_paths)
+    retried = set()
+    # 'spawn' avoids forking the multithreaded Streamlit server and the OCR frameworks
+    context = multiprocessing.get_context("spawn")
+    while pending:
+        finished = queue.Queue()
+        running = {}  # pdf_path -> started
+        # Leaving the block terminates the pool, and with it any worker still running
+        with context.Pool(processes=min(max_workers, len(pending)), initializer=_init_worker) as pool:
+            while pending or running:
+                while pending and len(running) < max_workers:
+                    pdf_path = pending.pop(0)
+                    running[pdf_path] = time.monotonic()
+                    pool.apply_async(
+                        classify_document, (pdf_path, staged),
+                        callback=lambda result, pdf_path=pdf_path: finished.put((pdf_path, result, None)),
+                        error_callback=lambda error, pdf_path=pdf_path: finished.put((pdf_path, None, error)),
+                    )
+
+                first_deadline = min(running.values()) + timeout
+                try:
+                    pdf_path, result, error = finished.get(timeout=max(0.0, first_deadline - time.monotonic()))
+                except queue.Empty:
+                    now = time.monotonic()
+                    for pdf_path, started in running.items():
+                        if now - started >= timeout:
+                            classified[pdf_path] = _error_result(pdf_path, f"Tiempo de procesamiento agotado ({timeout} s)")
+                        elif pdf_path in retried:
+                            classified[pdf_path] = _error_result(pdf_path, "Error al procesar el documento: se reinició el proceso de clasificación")
+                        else:
+                            retried.add(pdf_path)
+                            pending.insert(0, pdf_path)
+                    break
+
+                del running[pdf_path]
+                if error is not None:
+                    classified[pdf_path] = _error_result(pdf_path, f"Error al procesar el documento: {error}")
+                else:
+                    classified[pdf_path] = result
+    return classified
+
+
+def classify_documents(pdf_paths, parallel=None, max_workers=None, timeout=None, staged=None):
+    """
+    Extracts the text of every document of a case and classifies it.
+
+    In parallel mode each document is rendered, OCRed and classified on a bounded
+    process pool of the case, so the case takes about as long as its slowest document.
+    Failures and timeouts are reported per document, which is then classified as
+    'REVISAR'; a document that times out also ends its worker.
+
+    Args:
+        pdf_paths (list of str): Paths to the PDF files of the case.
+        parallel (bool, optional): Use the process pool. Defaults to True when more than
+            one worker is configured and there is more than one document.
+        max_workers (int, optional): Pool size. Defaults to CLASSIFICATION_WORKERS or the CPU count.
+        timeout (float, optional): Seconds each document may run. Defaults to
+            CLASSIFICATION_TIMEOUT or 300.
+        staged (bool, optional): Classify scanned pages from a low-resolution OCR pass
+            and defer full OCR. Defaults to True unless STAGED_OCR=0.
+
+    Returns:
+        dict: Maps each PDF path to a dict with keys:
+            - 'type' (str): Classified document type.
+            - 'new_name' (str): File name reflecting the document type.
+            - 'text' (list of str): Text lines of the document.
+            - 'text_level' (str): 'full', or 'preview' if the text comes from the
+              low-resolution pass (or is empty, for documents recognized by their layout)
+              and must go through `ensure_full_text` before extraction.
+            - 'confidence' (float): Classifier confidence between 0 and 1.
+            - 'error' (str or None): Failure or timeout message.
+    """
+    pdf_paths = list(pdf_paths)
+    if max_workers is None:
+        max_workers = int(os.getenv("CLASSIFICATION_WORKERS", "0")) or os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(pdf_paths)))
+    if timeout is None:
+        timeout = float(os.getenv("CLASSIFICATION_TIMEOUT", "300"))
+    if parallel is None:
+        parallel = max_workers > 1
+    if staged is None:
+        staged = _staged_ocr_enabled()
+
+    if not pdf_paths:
+        return {}
+    if parallel:
+        return _classify_parallel(pdf_paths, max_workers, timeout, staged)
+    return _classify_sequential(pdf_paths, staged)
+
+
+def ensure_full_text(documents):
+    """
+    Runs full-resolution OCR, in one batch, for the documents whose text is still the
+    low-resolution preview and is needed by a data extractor. Other documents (e.g.
+    the tarjeta reverso) are left untouched.
+
+    Args:
+        documents (iterable of dict): Classified document entries with keys 'type',
+            'filename', 'text' and optionally 'text_level'. Updated in place; a
+            document whose OCR fails keeps its preview text and gets an 'error'.
+    """
+    pending = [
+        doc_info for doc_info in documents
+        if doc_info.get("text_level") == "preview" and doc_info["type"] in TEXT_REQUIRED_TYPES
+    ]
+    if not pending:
+        return
+
+    _init_worker()
+    texts = _ocr_pages([doc_info["filename"] for doc_info in pending], FULL_DPI)
+    for doc_info in pending:
+        results = texts[doc_info["filename"]]
+        if isinstance(results, Exception):
+            # One bad page must not abort the case; the preview text is still usable
+            doc_info["error"] = f"Error al procesar el documento: {results}"
+            continue
+        doc_info["text"] = results
+        doc_info["text_level"] = "full"
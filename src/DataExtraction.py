@@ -1,36 +1,223 @@
+import os
 import re
+import time
+import queue
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
-from google import genai
+from GeminiClient import GEMINI_MODEL, generate_with_system, response_text
+from ResponseCache import get_response_cache
+from FieldExtraction import FieldExtractor
+from MRZ import parse_td1
+from PromptCompaction import PromptCompactor, compaction_enabled
+from ExtractionSchemas import (
+    INE_SCHEMA, FACTURA_SCHEMA, FACTURA_REVERSO_SCHEMA, TARJETA_CIRCULACION_SCHEMA, PartialJSONParser,
+    load_json_object,
+)
+from google.genai import types
 import json
 
-def call_gemini(api_key: str, system_message: str, input_message: str):
-    prompt = f"{system_message}\n\nTexto extraído del documento:\n{input_message}\n\nPor favor, responde solo con el JSON correspondiente."
-    client = genai.Client(api_key=api_key)
-    response = client.models.generate_content(model="gemini-2.0-flash", contents=prompt)
-    return response
+def call_gemini(api_key: str, system_message: str, input_message: str, config=None, instrucciones="", stream=False):
+    # The static system message goes as the system instruction, apart from the
+    # document text and the per-request instructions
+    prompt = f"Texto extraído del documento:\n{input_message}\n\n{instrucciones}Por favor, responde solo con el JSON correspondiente."
+    return generate_with_system(api_key, system_message, prompt, config=config, stream=stream)
 
 class BaseDataExtractor:
+    esquema = None  # DocumentSchema, to be overridden in subclass
+    campos_requeridos = []  # To be overridden in subclass, in the order of the prompt
+
     def __init__(self, texto, api_key):
         self.texto = texto
         self.api_key = api_key
         self.system_message = ""  # To be overridden in subclass
+        self.compactacion = None
 
     def parse_json(self, response):
-        json_response = response.model_dump_json()
-        json_data = json.loads(json_response)
-        json_processed = json_data['candidates'][0]['content']['parts'][0]['text']
-        content = json_processed.strip("```json\n").strip("```")
-        parsed_json = json.loads(content)
+        return self.parse_text(response_text(response))
+
+    def parse_text(self, text, campos=None):
+        if self.esquema is not None:
+            return self.esquema.parse(text, campos)
+        parsed_json = load_json_object(text)
+        if parsed_json is None:
+            raise ValueError(f"La respuesta no contiene un objeto JSON: {text[:200]}")
         return parsed_json
 
-    def extraer_datos(self):
-        response = call_gemini(self.api_key, self.system_message, self.texto)
-        return self.parse_json(response)
+    def generation_config(self, campos=None):
+        # The response schema makes Gemini answer with exactly the requested keys and types
+        if self.esquema is None:
+            return types.GenerateContentConfig(response_mime_type="application/json")
+        return types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=self.esquema.response_schema(campos),
+        )
+
+    def extraer_campos(self):
+        return FieldExtractor().extract(self.texto, self.campos_requeridos)
+
+    def extraer_datos(self, on_fields=None):
+        # Fields with a rigid format are read directly from the text; the LLM only gets the rest
+        encontrados = self.extraer_campos()
+        faltantes = [campo for campo in self.campos_requeridos if campo not in encontrados]
+        if self.campos_requeridos and not faltantes:
+            return encontrados
+        if on_fields and encontrados:
+            on_fields(dict(encontrados))
+
+        instrucciones = ""
+        if encontrados:
+            instrucciones = (
+                "Responde únicamente con las siguientes claves, las demás ya fueron extraídas: "
+                + ", ".join(f'"{campo}"' for campo in faltantes) + ".\n\n"
+            )
+        # Only the lines around the anchors of the missing fields are sent
+        texto = self.texto
+        if compaction_enabled():
+            self.compactacion = PromptCompactor().compact(self.texto, faltantes)
+            texto = self.compactacion.text
+        datos = self.consultar_llm(faltantes, texto, instrucciones, on_fields)
+
+        resultado = {campo: encontrados.get(campo, datos.get(campo, 'N/A')) for campo in self.campos_requeridos}
+        resultado.update({campo: valor for campo, valor in datos.items() if campo not in resultado})
+        return resultado
+
+    def consultar_llm(self, campos=None, texto=None, instrucciones="", on_fields=None):
+        texto = self.texto if texto is None else texto
+        # Identical requests are served from the response cache
+        cache = get_response_cache()
+        key = cache.make_key(GEMINI_MODEL, self.system_message, instrucciones + texto) if cache else None
+        text = cache.get(key) if cache else None
+        if text is not None:
+            return self.parse_text(text, campos)
+
+        config = self.generation_config(campos)
+        if on_fields is None:
+            text = response_text(call_gemini(self.api_key, self.system_message, texto, config, instrucciones))
+        else:
+            text = self.leer_stream(call_gemini(self.api_key, self.system_message, texto, config, instrucciones, stream=True), on_fields)
+        datos = self.parse_text(text, campos)
+        # Only well-formed answers are cached, so a truncated one is asked again next time
+        if cache and load_json_object(text) is not None:
+            cache.set(key, text)
+        return datos
+
+    def leer_stream(self, chunks, on_fields):
+        """
+        Reads a streamed response, reporting each field as soon as its value is complete.
+
+        Args:
+            chunks (iterator): Response chunks from Gemini.
+            on_fields (callable): Called with a dict of the newly completed fields.
+
+        Returns:
+            str: The full response text.
+        """
+        parser = PartialJSONParser()
+        try:
+            for chunk in chunks:
+                campos = parser.feed(chunk.text or "")
+                if campos:
+                    on_fields(self.esquema.coerce_partial(campos) if self.esquema is not None else campos)
+        finally:
+            # Releases the connection and accounts the tokens even if reading stops early
+            chunks.close()
+        return parser.buffer
+
+    @staticmethod
+    def extraer_datos_stream(extractors, timeout=None, max_workers=None, parciales=True, en_curso=None):
+        """
+        Runs several extractors concurrently and yields their results as they arrive.
+
+        Args:
+            extractors (dict): Maps a key (e.g. 'datos_factura') to an extractor.
+            timeout (float, optional): Seconds to wait for the requests. Defaults to
+                EXTRACTION_TIMEOUT or 60.
+            max_workers (int, optional): Threads. Defaults to one per extractor.
+            parciales (bool): Stream the Gemini responses and yield fields as they are read.
+            en_curso (dict, optional): Maps more keys to futures of extractions already
+                running elsewhere (e.g. speculative ones), whose result is
+                (datos, compactación); their results are yielded as they finish.
+
+        Yields:
+            tuple: ('campos', key, dict of fields read so far) while an extractor runs, if
+            `parciales`, and ('datos', key, {'datos': dict or None, 'error': str or None,
+            'compactacion': CompactionResult or None}) once per key.
+        """
+        en_curso = en_curso or {}
+        if not extractors and not en_curso:
+            return
+        if timeout is None:
+            timeout = float(os.getenv("EXTRACTION_TIMEOUT", "60"))
+
+        # Worker threads only enqueue events; the caller consumes them in its own thread
+        events = queue.Queue()
+
+        def run(key, extractor):
+            on_fields = (lambda campos: events.put(("campos", key, campos))) if parciales else None
+            try:
+                datos = extractor.extraer_datos(on_fields)
+                events.put(("datos", key, {"datos": datos, "error": None, "compactacion": extractor.compactacion}))
+            except Exception as e:
+                events.put(("datos", key, {"datos": None, "error": f"Error al extraer los datos: {e}", "compactacion": None}))
+
+        def finished(key, future):
+            try:
+                datos, compactacion = future.result()
+                events.put(("datos", key, {"datos": datos, "error": None, "compactacion": compactacion}))
+            except Exception as e:
+                events.put(("datos", key, {"datos": None, "error": f"Error al extraer los datos: {e}", "compactacion": None}))
+
+        executor = ThreadPoolExecutor(max_workers=max_workers or max(1, len(extractors)))
+        pending = set(extractors) | set(en_curso)
+        deadline = time.monotonic() + timeout
+        try:
+            for key, extractor in extractors.items():
+                # Each worker keeps the caller's context (case token usage, call priority)
+                executor.submit(contextvars.copy_context().run, run, key, extractor)
+            for key, future in en_curso.items():
+                future.add_done_callback(lambda future, key=key: finished(key, future))
+            while pending:
+                try:
+                    kind, key, payload = events.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if kind == "datos":
+                    pending.discard(key)
+                yield kind, key, payload
+
+            for key in pending:
+                yield "datos", key, {"datos": None, "error": f"Tiempo de extracción agotado ({timeout} s)", "compactacion": None}
+        finally:
+            # Requests still running are abandoned, not awaited
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def extraer_datos_many(extractors, timeout=None, max_workers=None):
+        """
+        Runs several extractors concurrently, one Gemini request per thread.
+
+        Args:
+            extractors (dict): Maps a key (e.g. 'datos_factura') to an extractor.
+            timeout (float, optional): Seconds to wait for the requests. Defaults to
+                EXTRACTION_TIMEOUT or 60.
+            max_workers (int, optional): Threads. Defaults to one per extractor.
+
+        Returns:
+            dict: Maps each key to {'datos': dict or None, 'error': str or None,
+            'compactacion': CompactionResult or None}.
+        """
+        events = BaseDataExtractor.extraer_datos_stream(extractors, timeout, max_workers, parciales=False)
+        return {key: payload for _, key, payload in events}
 
 class INEDataExtractor(BaseDataExtractor):
-    def __init__(self, texto, api_key):
+    esquema = INE_SCHEMA
+    campos_requeridos = INE_SCHEMA.names
+
+    def __init__(self, texto, api_key, texto_reverso=None):
         super().__init__(texto, api_key)
+        self.texto_reverso = texto_reverso
         self.system_message = """
             Eres un experto en análisis de documentos semiestructurados en español, especialmente en credenciales del INE (Instituto Nacional Electoral) mexicanas.  
             Tu tarea es leer cuidadosamente el contenido proporcionado y extraer la siguiente información clave.  
@@ -49,10 +236,22 @@ class INEDataExtractor(BaseDataExtractor):
             - No infieras ni completes información por tu cuenta. Si algún campo no está disponible, indica 'N/A'.
         """
 
+    def extraer_campos(self):
+        encontrados = super().extraer_campos()
+        # The MRZ dates on the back are protected by check digits, so they take precedence over the front
+        mrz = parse_td1(self.texto_reverso.splitlines()) if self.texto_reverso else None
+        if mrz is not None and mrz.valid:
+            encontrados.update(mrz.to_ine_fields())
+        return encontrados
+
 
 class FacturaDataExtractor(BaseDataExtractor):
-    def __init__(self, texto, api_key):
+    esquema = FACTURA_SCHEMA
+    campos_requeridos = FACTURA_SCHEMA.names
+
+    def __init__(self, texto, api_key, datos_cfdi=None):
         super().__init__(texto, api_key)
+        self.datos_cfdi = datos_cfdi or {}
         self.system_message = """
             Eres un experto en análisis de documentos semiestructurados en español, especialmente en facturas de vehículos.  
             Tu tarea es leer cuidadosamente el contenido proporcionado y extraer la siguiente información clave.  
@@ -82,9 +281,18 @@ class FacturaDataExtractor(BaseDataExtractor):
             - No infieras ni completes información por tu cuenta. Si algún campo no está disponible, indica 'N/A'.
         """
 
+    def extraer_campos(self):
+        encontrados = super().extraer_campos()
+        # Values from the CFDI XML are exact and take precedence over the OCR text
+        encontrados.update({campo: valor for campo, valor in self.datos_cfdi.items() if campo in self.campos_requeridos})
+        return encontrados
+
 
 
 class FacturaReversoDataExtractor(BaseDataExtractor):
+    esquema = FACTURA_REVERSO_SCHEMA
+    campos_requeridos = FACTURA_REVERSO_SCHEMA.names
+
     def __init__(self, texto, api_key):
         super().__init__(texto, api_key)
         self.system_message = """
@@ -104,6 +312,9 @@ class FacturaReversoDataExtractor(BaseDataExtractor):
 
 
 class TarjetCirculacionDataExtractor(BaseDataExtractor):
+    esquema = TARJETA_CIRCULACION_SCHEMA
+    campos_requeridos = TARJETA_CIRCULACION_SCHEMA.names
+
     def __init__(self, texto, api_key):
         super().__init__(texto, api_key)
         self.system_message = """
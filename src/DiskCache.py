@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class DiskCache:
+    """
+    Persistent key-value cache stored in a SQLite database, safe to share between
+    threads and processes.
+
+    Values are stored as JSON. Entries can expire after `ttl` seconds, and once the
+    stored values exceed `max_bytes` the least recently used entries are evicted.
+
+    Attributes:
+        path (str): Path to the SQLite database file.
+        max_bytes (int): Maximum total size of the stored values.
+        ttl (float or None): Seconds after which an entry expires. None disables expiry.
+        hits (int): Number of lookups served from the cache by this instance.
+        misses (int): Number of lookups that were not in the cache.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, ttl=None):
+        """
+        Initializes the cache, creating the database if needed.
+
+        Args:
+            path (str): Path to the SQLite database file.
+            max_bytes (int): Maximum total size of the stored values.
+            ttl (float, optional): Seconds after which an entry expires.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """
+        Returns the cached value for `key`, or None if it is missing or expired.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            object or None: The JSON-decoded value.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """
+        Stores `value` under `key` and evicts the least recently used entries if the
+        cache grows beyond `max_bytes`.
+
+        Args:
+            key (str): Cache key.
+            value (object): JSON-serializable value.
+        """
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload.encode("utf-8")), now, now),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """
+        Deletes expired entries and then the least recently used ones until the total
+        size fits in `max_bytes`.
+        """
+        if self.ttl is not None:
+            conn.execute("DELETE FROM cache WHERE created_at < ?", (time.time() - self.ttl,))
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM cache ORDER BY last_access").fetchall():
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        """
+        Deletes every entry.
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache")
+
+    def stats(self):
+        """
+        Returns the hit and miss counters of this instance.
+
+        Returns:
+            dict: Keys 'hits', 'misses' and 'hit_rate'.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
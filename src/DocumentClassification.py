@@ -1,51 +1,203 @@
 import os
+import re
+
+# Exact lines that identify a document type on their own
+PHRASE_CHECKS = {
+    'CEDO': 'FACTURA REVERSO',
+    'FACTURA': 'FACTURA',
+    'MÉXICO INSTITUTO NACIONAL ELECTORAL': 'INE',
+    'TARJETA DE CIRCULACIÓN VEHICULAR': 'TARJETA CIRCULACION',
+    'CODIFICACIONES': 'TARJETA CIRCULACION REVERSO',
+}
+
+# Words that hint at a document type; the order is used only to break ties
+KEYWORD_CHECKS = {
+    'FACTURA REVERSO': ['CEDO', 'DERECHOS'],
+    'FACTURA': ['FACTURA', 'AUTOMOTRIZ', 'EMISOR'],
+    'INE': ['ELECTORAL', 'INSTITUTO', 'CREDENCIAL', 'VOTAR'],
+    'INE REVERSO': ['INE', 'IDME', 'IDMEX', 'CREDENCIAL', 'VOTAR'],
+    'TARJETA CIRCULACION': ['CIRCULACIÓN', 'TARJETA', 'VEHICULO', 'TRANSPORTE', 'GOBIERNO'],
+    'TARJETA CIRCULACION REVERSO': ['CODIFICACIONES', 'CACIONES', 'MODALIDAO', 'TRANSPORTE', 'GASOLINA', 'EDOMEX'],
+}
+
+DOCUMENT_TYPES = list(KEYWORD_CHECKS)
+
+PHRASE_WEIGHT = 5
+KEYWORD_WEIGHT = 1
+MIN_CONFIDENCE = float(os.getenv("CLASSIFIER_MIN_CONFIDENCE", "0.6"))
+
+# 'rules' (keyword matcher) or 'statistical' (see StatisticalClassifier.py)
+CLASSIFIER_STRATEGY = os.getenv("CLASSIFIER_STRATEGY", "rules")
+
+
+class KeywordMatcher:
+    """
+    Matcher compiled once per process that scores every document type in a single
+    pass over the OCR lines.
+
+    Exact phrases are looked up by line, lines starting with 'IDMEX' (the INE
+    machine-readable zone) count as a phrase for 'INE REVERSO', and all keywords are
+    found with one precompiled regular expression over whitespace-delimited words.
+    """
+
+    def __init__(self, phrase_checks, keyword_checks):
+        """
+        Compiles the matcher.
+
+        Args:
+            phrase_checks (dict): Maps exact lines to document types.
+            keyword_checks (dict): Maps document types to lists of keywords.
+        """
+        self.phrase_checks = phrase_checks
+        self.document_types = list(keyword_checks)
+
+        self.keyword_types = {}
+        for doc_type, keywords in keyword_checks.items():
+            for word in keywords:
+                self.keyword_types.setdefault(word, []).append(doc_type)
+
+        words = sorted(self.keyword_types, key=len, reverse=True)
+        self.keyword_pattern = re.compile(r"(?<!\S)(" + "|".join(map(re.escape, words)) + r")(?!\S)")
+
+    def score(self, lines):
+        """
+        Scores every document type for a document.
+
+        Args:
+            lines (list of str): Uppercase text lines of the document.
+
+        Returns:
+            dict: Maps each document type to its score.
+        """
+        scores = dict.fromkeys(self.document_types, 0)
+        found = set()
+        for line in lines:
+            doc_type = self.phrase_checks.get(line)
+            if doc_type is not None:
+                scores[doc_type] += PHRASE_WEIGHT
+            if line.startswith('IDMEX'):
+                scores['INE REVERSO'] += PHRASE_WEIGHT
+            found.update(self.keyword_pattern.findall(line))
+
+        for word in found:
+            for doc_type in self.keyword_types[word]:
+                scores[doc_type] += KEYWORD_WEIGHT
+        return scores
+
+    def best(self, scores):
+        """
+        Picks the highest scoring type and its confidence.
+
+        The confidence is the share of the best score over the best and runner-up
+        scores: 1.0 when only one type matches and 0.5 on a tie.
+
+        Args:
+            scores (dict): Scores returned by `score`.
+
+        Returns:
+            tuple: (document type or None, confidence between 0 and 1).
+        """
+        ranked = sorted(self.document_types, key=lambda doc_type: -scores[doc_type])
+        top = scores[ranked[0]]
+        if top == 0:
+            return None, 0.0
+        runner_up = scores[ranked[1]] if len(ranked) > 1 else 0
+        return ranked[0], top / (top + runner_up)
+
+
+_MATCHER = KeywordMatcher(PHRASE_CHECKS, KEYWORD_CHECKS)
+
+
+def _statistical_model(strategy):
+    """
+    Returns the trained statistical model when the 'statistical' strategy is selected
+    and the model file exists, or None to fall back to the keyword rules.
+    """
+    if (strategy or CLASSIFIER_STRATEGY) != "statistical":
+        return None
+    from StatisticalClassifier import get_statistical_classifier
+    return get_statistical_classifier()
+
 
 class DocumentClassifier:
     """
     A class to classify documents based on recognized text from OCR output.
-    
-    This classifier uses a combination of exact phrase matching and keyword-based 
-    heuristics to determine the type of document and renames the file accordingly.
+
+    This classifier scores every document type at once from exact phrase matches and
+    keyword hits, and renames the file according to the best scoring type. With the
+    'statistical' strategy the trained linear model is used instead, if available.
+    Documents whose confidence is below `min_confidence` are sent to 'REVISAR'.
 
     Attributes:
         image_path (str): The original file path of the image/document.
         results (list of str): Text strings extracted from the image (usually OCR output).
-        results_set (set): A set of individual uppercase words extracted from results.
         base_name (str): File name without extension.
+        min_confidence (float): Minimum confidence to accept a classification.
+        strategy (str): 'rules' or 'statistical'.
+        scores (dict): Score of every document type, set by `classify()`.
+        confidence (float): Confidence of the last classification, set by `classify()`.
 
     Methods:
         classify(): Classifies the document and returns the renamed file path and type.
+        classify_batch(): Classifies several OCR results at once.
     """
 
-    def __init__(self, image_path, results):
+    phrase_checks = PHRASE_CHECKS
+    keyword_checks = KEYWORD_CHECKS
+
+    def __init__(self, image_path, results, min_confidence=None, strategy=None):
         """
         Initializes the DocumentClassifier with image path and OCR results.
 
         Parameters:
             image_path (str): The original file path of the image/document.
             results (list of str): Text strings extracted from the image.
+            min_confidence (float, optional): Minimum confidence to accept a
+                classification. Defaults to CLASSIFIER_MIN_CONFIDENCE or 0.6.
+            strategy (str, optional): 'rules' or 'statistical'. Defaults to
+                CLASSIFIER_STRATEGY or 'rules'.
         """
         self.image_path = image_path
         self.results = list(map(str.upper, results))
-        self.results_set = set(word for phrase in self.results for word in phrase.split())
         self.base_name, _ = os.path.splitext(self.image_path)
+        self.min_confidence = MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.strategy = strategy or CLASSIFIER_STRATEGY
+        self.scores = {}
+        self.confidence = 0.0
+
+    @staticmethod
+    def classify_batch(list_of_ocr_results, min_confidence=None, strategy=None):
+        """
+        Classifies several documents with the shared compiled matcher, or with a single
+        matrix multiplication when the statistical strategy is selected.
+
+        Parameters:
+            list_of_ocr_results (list of list of str): OCR results, one list per document.
+            min_confidence (float, optional): Minimum confidence to accept a classification.
+            strategy (str, optional): 'rules' or 'statistical'.
 
-        self.phrase_checks = {
-            'CEDO': 'FACTURA REVERSO',
-            'FACTURA': 'FACTURA',
-            'MÉXICO INSTITUTO NACIONAL ELECTORAL': 'INE',
-            'TARJETA DE CIRCULACIÓN VEHICULAR': 'TARJETA CIRCULACION',
-            'CODIFICACIONES': 'TARJETA CIRCULACION REVERSO',
-        }
-
-        self.keyword_checks = {
-            'FACTURA REVERSO': ['CEDO', 'DERECHOS'],
-            'FACTURA': ['FACTURA', 'AUTOMOTRIZ', 'EMISOR'],
-            'INE': ['ELECTORAL', 'INSTITUTO', 'CREDENCIAL', 'VOTAR'],
-            'INE REVERSO': ['INE', 'IDME', 'IDMEX', 'CREDENCIAL', 'VOTAR'],
-            'TARJETA CIRCULACION': ['CIRCULACIÓN', 'TARJETA', 'VEHICULO', 'TRANSPORTE', 'GOBIERNO'],
-            'TARJETA CIRCULACION REVERSO': ['CODIFICACIONES', 'CACIONES', 'MODALIDAO', 'TRANSPORTE', 'GASOLINA', 'EDOMEX'],
-        }
+        Returns:
+            list of tuple: (document type, confidence) for each document, in order.
+            Low-confidence documents get type 'REVISAR'.
+        """
+        if min_confidence is None:
+            min_confidence = MIN_CONFIDENCE
+
+        model = _statistical_model(strategy)
+        if model is not None:
+            predictions = model.classify_batch(list_of_ocr_results)
+        else:
+            predictions = [
+                _MATCHER.best(_MATCHER.score([line.upper() for line in results]))
+                for results in list_of_ocr_results
+            ]
+
+        classified = []
+        for doc_type, confidence in predictions:
+            if doc_type is None or confidence < min_confidence:
+                doc_type = 'REVISAR'
+            classified.append((doc_type, confidence))
+        return classified
 
     def classify(self):
         """
@@ -55,21 +207,21 @@ class DocumentClassifier:
             tuple:
                 - new_name (str): The new file name reflecting the identified document type.
                 - document (str): The classified document type. Possible values:
-                  'FACTURA', 'FACTURA REVERSO', 'INE', 'INE REVERSO', 
+                  'FACTURA', 'FACTURA REVERSO', 'INE', 'INE REVERSO',
                   'TARJETA CIRCULACION', 'TARJETA CIRCULACION_REVERSO', or 'REVISAR'.
         """
-        for phrase, doc_type in self.phrase_checks.items():
-            if phrase in self.results:
-                return self._build_output(doc_type)
-
-        if any(s.startswith('IDMEX') for s in self.results):
-            return self._build_output('INE REVERSO')
-
-        for doc_type, keywords in self.keyword_checks.items():
-            if any(word in self.results_set or word in self.results for word in keywords):
-                return self._build_output(doc_type)
+        model = _statistical_model(self.strategy)
+        if model is not None:
+            self.scores = dict(zip(model.classes, model.predict_proba([self.results])[0].tolist()))
+            doc_type = max(self.scores, key=self.scores.get)
+            self.confidence = self.scores[doc_type]
+        else:
+            self.scores = _MATCHER.score(self.results)
+            doc_type, self.confidence = _MATCHER.best(self.scores)
 
-        return self._build_output('REVISAR')
+        if doc_type is None or self.confidence < self.min_confidence:
+            return self._build_output('REVISAR')
+        return self._build_output(doc_type)
 
     def _build_output(self, doc_type):
         """
@@ -0,0 +1,292 @@
+import re
+import json
+from dataclasses import dataclass
+from typing import List, Optional
+
+from google.genai import types
+
+FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+
+def strip_fences(text):
+    """
+    Removes a leading ```json fence and a trailing ``` fence, if present.
+
+    Args:
+        text (str): Model output.
+
+    Returns:
+        str: The text without Markdown code fences.
+    """
+    return FENCE_PATTERN.sub("", text)
+
+
+def load_json_object(text):
+    """
+    Parses the JSON object of a model output, tolerating code fences and text around it.
+
+    Args:
+        text (str): Model output.
+
+    Returns:
+        dict or None: The parsed object, or None if there is no valid JSON object.
+    """
+    text = strip_fences(text)
+    candidates = [text]
+    start, end = text.find("{"), text.rfind("}")
+    if 0 <= start < end:
+        candidates.append(text[start:end + 1])
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+class PartialJSONParser:
+    """
+    Reads the top-level "key": value pairs of a JSON object while it is being streamed.
+
+    Each call to `feed` returns the pairs completed by the new chunk. A value is only
+    reported once the separator after it has arrived, so a number or string cut in the
+    middle of a chunk is never reported truncated.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.done = False
+        self._pos = None  # Index after the last '{' or ',' consumed
+        self._decoder = json.JSONDecoder()
+
+    def _skip(self, pos):
+        while pos < len(self.buffer) and self.buffer[pos].isspace():
+            pos += 1
+        return pos
+
+    def feed(self, chunk):
+        """
+        Adds a chunk of the model output.
+
+        Args:
+            chunk (str): Next piece of text.
+
+        Returns:
+            dict: Pairs completed by this chunk.
+        """
+        self.buffer += chunk
+        pairs = {}
+        if self._pos is None:
+            start = self.buffer.find("{")  # Skips a leading code fence
+            if start < 0:
+                return pairs
+            self._pos = start + 1
+
+        while not self.done:
+            pos = self._skip(self._pos)
+            if pos < len(self.buffer) and self.buffer[pos] == "}":
+                self.done = True
+                break
+            try:
+                key, pos = self._decoder.raw_decode(self.buffer, pos)
+                pos = self._skip(pos)
+                if pos >= len(self.buffer) or self.buffer[pos] != ":":
+                    break
+                value, pos = self._decoder.raw_decode(self.buffer, self._skip(pos + 1))
+            except ValueError:
+                break  # Incomplete (or malformed) pair; the final parse handles the latter
+            pos = self._skip(pos)
+            if pos >= len(self.buffer) or self.buffer[pos] not in ",}":
+                break
+            pairs[key] = value
+            self.done = self.buffer[pos] == "}"
+            self._pos = pos + 1
+        return pairs
+
+
+@dataclass
+class Field:
+    """
+    A field of a document schema.
+
+    Attributes:
+        name (str): Key used in the prompt and in the extracted data.
+        type (str): 'string' or 'boolean'.
+        enum (list of str, optional): Allowed values of a string field.
+    """
+    name: str
+    type: str = "string"
+    enum: Optional[List[str]] = None
+
+    def schema(self):
+        if self.type == "boolean":
+            return types.Schema(type=types.Type.BOOLEAN)
+        return types.Schema(type=types.Type.STRING, enum=self.enum)
+
+    def coerce(self, value):
+        """
+        Converts a raw value to the field type.
+
+        Returns:
+            object: The typed value, or None if it does not fit the field.
+        """
+        if self.type == "boolean":
+            if isinstance(value, bool):
+                return value
+            if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+                return value.strip().lower() == "true"
+            return None
+        if value is None or isinstance(value, (dict, list)):
+            return None
+        value = str(value).strip()
+        if self.enum is not None:
+            value = value.lower()
+            return value if value in self.enum else None
+        return value
+
+
+class DocumentSchema:
+    """
+    Typed description of the data extracted from a document type.
+
+    It is sent to Gemini as the response schema, so the model answers with a JSON
+    object of exactly these keys, and it validates the answer field by field: a field
+    with a wrong type or missing from the answer becomes 'N/A' without discarding the
+    rest. If the JSON itself is broken, the fields that can still be read are recovered.
+
+    Attributes:
+        fields (list of Field): Fields in prompt order.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self._by_name = {field.name: field for field in fields}
+
+    @property
+    def names(self):
+        return [field.name for field in self.fields]
+
+    def response_schema(self, campos=None):
+        """
+        Builds the Gemini response schema.
+
+        Args:
+            campos (list of str, optional): Subset of fields to request. Defaults to all.
+
+        Returns:
+            types.Schema: Object schema with the requested fields, all required.
+        """
+        campos = campos or self.names
+        return types.Schema(
+            type=types.Type.OBJECT,
+            properties={campo: self._by_name[campo].schema() for campo in campos},
+            required=list(campos),
+            property_ordering=list(campos),
+        )
+
+    def _salvage(self, text, campos):
+        """
+        Reads individual "key": value pairs from a malformed JSON output.
+        """
+        recovered = {}
+        for campo in campos:
+            match = re.search(
+                re.escape(json.dumps(campo, ensure_ascii=False)) + r'\s*:\s*("(?:[^"\\]|\\.)*"|true|false|null)',
+                text,
+            )
+            if match:
+                try:
+                    recovered[campo] = json.loads(match.group(1))
+                except ValueError:
+                    pass
+        return recovered
+
+    def coerce_partial(self, raw):
+        """
+        Validates the pairs read so far from a streamed output.
+
+        Args:
+            raw (dict): Pairs returned by PartialJSONParser.
+
+        Returns:
+            dict: Known fields with their typed value, or 'N/A' if invalid.
+        """
+        datos = {}
+        for campo, valor in raw.items():
+            if campo in self._by_name:
+                value = self._by_name[campo].coerce(valor)
+                datos[campo] = "N/A" if value is None or value == "" else value
+        return datos
+
+    def parse(self, text, campos=None):
+        """
+        Parses and validates a model output.
+
+        Args:
+            text (str): Model output.
+            campos (list of str, optional): Fields that were requested. Defaults to all.
+
+        Returns:
+            dict: Every requested field with its typed value, or 'N/A' if it is missing
+            or invalid.
+        """
+        campos = campos or self.names
+        raw = load_json_object(text)
+        if raw is None:
+            raw = self._salvage(text, campos)
+
+        datos = {}
+        for campo in campos:
+            value = self._by_name[campo].coerce(raw.get(campo))
+            datos[campo] = "N/A" if value is None or value == "" else value
+        return datos
+
+
+INE_SCHEMA = DocumentSchema([
+    Field("Nombre del solicitante"),
+    Field("Vigencia"),
+    Field("Vigente", type="boolean"),
+    Field("Clave de elector"),
+    Field("Fecha de nacimiento"),
+])
+
+FACTURA_SCHEMA = DocumentSchema([
+    Field("Nombre del solicitante"),
+    Field("Marca"),
+    Field("Modelo"),
+    Field("Año"),
+    Field("Versión"),
+    Field("Número de motor"),
+    Field("NIV"),
+    Field("Leyenda primera emisión"),
+    Field("Cadena original del complemento de certificación digital del SAT"),
+    Field("Nombre Emisor"),
+    Field("Dirección de la agencia"),
+    Field("Folio Fiscal"),
+    Field("RFC Receptor"),
+    Field("RFC Emisor"),
+    Field("Fecha Certificación"),
+    Field("Fecha Expedición"),
+])
+
+FACTURA_REVERSO_SCHEMA = DocumentSchema([
+    Field("Nombre del nuevo dueño"),
+])
+
+TARJETA_CIRCULACION_SCHEMA = DocumentSchema([
+    Field("Nombre del solicitante"),
+    Field("Tipo de fecha de vigencia", enum=["fecha", "periodo", "permanente"]),
+    Field("Valor de fecha de vigencia"),
+    Field("Fecha de expedición"),
+    Field("Placa"),
+    Field("Estado o entidad federativa"),
+    Field("NIV"),
+    Field("Número de motor"),
+    Field("Marca"),
+    Field("Modelo"),
+    Field("Año"),
+    Field("Versión"),
+    Field("Uso del vehículo"),
+])
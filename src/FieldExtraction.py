@@ -0,0 +1,247 @@
+import re
+from datetime import datetime
+
+# Character values and weights of the NIV (VIN) check digit, ISO 3779 / NOM-131
+_NIV_VALUES = {
+    **{str(digit): digit for digit in range(10)},
+    **dict(zip("ABCDEFGH", range(1, 9))),
+    **dict(zip("JKLMN", range(1, 6))), "P": 7, "R": 9,
+    **dict(zip("STUVWXYZ", range(2, 10))),
+}
+_NIV_WEIGHTS = [8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2]
+
+# Character values of the RFC check digit (SAT)
+_RFC_ALPHABET = "0123456789ABCDEFGHIJKLMN&OPQRSTUVWXYZ Ñ"
+
+NIV_PATTERN = re.compile(r"(?<![A-Z0-9])[A-Z0-9]{17}(?![A-Z0-9])")
+RFC_PATTERN = re.compile(r"(?<![A-ZÑ&0-9])[A-ZÑ&]{3,4}\d{6}[A-Z0-9]{3}(?![A-Z0-9])")
+UUID_PATTERN = re.compile(r"[0-9A-F]{8}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{12}")
+CLAVE_ELECTOR_PATTERN = re.compile(r"(?<![A-Z0-9])[A-Z]{6}\d{8}[HM]\d{3}(?![A-Z0-9])")
+ISO_DATETIME_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}")
+DATE_PATTERN = re.compile(r"\d{2}/\d{2}/\d{4}|\d{4}-\d{2}-\d{2}|\d{2}-\d{2}-\d{4}")
+YEAR_RANGE_PATTERN = re.compile(r"\b((?:19|20)\d{2})(?:\s*-\s*((?:19|20)\d{2}))?\b")
+PLACA_PATTERN = re.compile(r"(?<![A-Z0-9-])[A-Z0-9]{2,4}-?[A-Z0-9]{2,4}-?[A-Z0-9]{0,2}(?![A-Z0-9-])")
+
+
+def niv_is_valid(niv):
+    """
+    Checks the length, alphabet and check digit (9th character) of a NIV.
+
+    Args:
+        niv (str): Candidate NIV.
+
+    Returns:
+        bool: True if the NIV is well formed.
+    """
+    if len(niv) != 17 or any(char not in _NIV_VALUES for char in niv):
+        return False
+    remainder = sum(_NIV_VALUES[char] * weight for char, weight in zip(niv, _NIV_WEIGHTS)) % 11
+    return niv[8] == ("X" if remainder == 10 else str(remainder))
+
+
+def rfc_is_valid(rfc):
+    """
+    Checks the format, date and check digit of an RFC (12 characters for companies,
+    13 for individuals).
+
+    Args:
+        rfc (str): Candidate RFC.
+
+    Returns:
+        bool: True if the RFC is well formed.
+    """
+    if not RFC_PATTERN.fullmatch(rfc):
+        return False
+    try:
+        datetime.strptime(rfc[-9:-3], "%y%m%d")
+    except ValueError:
+        return False
+    padded = rfc.rjust(13)[:12]
+    total = sum(_RFC_ALPHABET.index(char) * (13 - i) for i, char in enumerate(padded))
+    return rfc[-1] == _RFC_ALPHABET[(11 - total) % 11]
+
+
+def _unique(values):
+    """
+    Returns the value if all candidates agree, or None when there are none or they conflict.
+    """
+    values = set(values)
+    return values.pop() if len(values) == 1 else None
+
+
+def _windows(lines, labels, size=2):
+    """
+    Yields the text that follows each label: the rest of its line and the next `size` lines.
+    """
+    for i, line in enumerate(lines):
+        for label in labels:
+            position = line.find(label)
+            if position >= 0:
+                yield " ".join([line[position + len(label):]] + lines[i + 1:i + 1 + size])
+                break
+
+
+def _first_labeled(lines, labels, pattern, validate=None, size=2):
+    """
+    Returns the first match of `pattern` after one of `labels`, or None.
+    """
+    for window in _windows(lines, labels, size):
+        for match in pattern.finditer(window):
+            value = match.group(0)
+            if validate is None or validate(value):
+                return value
+    return None
+
+
+def extract_niv(lines):
+    # O, I and Q are not valid NIV characters; OCR confuses them with 0 and 1
+    candidates = []
+    for line in lines:
+        for text in (line, line.replace(" ", "")):
+            for match in NIV_PATTERN.finditer(text):
+                niv = match.group(0).translate(str.maketrans("OIQ", "010"))
+                if niv_is_valid(niv):
+                    candidates.append(niv)
+    return _unique(candidates)
+
+
+def extract_folio_fiscal(lines):
+    return _unique(match.group(0) for line in lines for match in UUID_PATTERN.finditer(line))
+
+
+def _rfc_labeled(lines, party):
+    """
+    Returns the RFC written right after an 'RFC <party>' or '<party> RFC' label on the
+    same line, or None. Values on other lines are not read: in the two-column CFDI
+    layout they may belong to the other party.
+    """
+    label = re.compile(
+        rf"(?:RFC\s*(?:DEL\s+)?{party}|{party}\s*[:.]?\s*RFC)\s*[:.]?\s*({RFC_PATTERN.pattern})"
+    )
+    return _unique(
+        match.group(1) for line in lines for match in label.finditer(line) if rfc_is_valid(match.group(1))
+    )
+
+
+def _rfcs(lines):
+    """
+    Returns the (emisor, receptor) RFCs; both are dropped if they agree, since that
+    means one of the labels was misread.
+    """
+    emisor, receptor = _rfc_labeled(lines, "EMISOR"), _rfc_labeled(lines, "RECEPTOR")
+    if emisor is not None and emisor == receptor:
+        return None, None
+    return emisor, receptor
+
+
+def extract_rfc_receptor(lines):
+    return _rfcs(lines)[1]
+
+
+def extract_rfc_emisor(lines):
+    return _rfcs(lines)[0]
+
+
+def extract_fecha_certificacion(lines):
+    return _first_labeled(lines, ["CERTIFICACIÓN", "CERTIFICACION"], ISO_DATETIME_PATTERN, size=1)
+
+
+def extract_fecha_expedicion_factura(lines):
+    return _first_labeled(lines, ["EXPEDICIÓN", "EXPEDICION", "EMISIÓN", "EMISION"], ISO_DATETIME_PATTERN, size=1)
+
+
+def extract_fecha_expedicion(lines):
+    return _first_labeled(lines, ["EXPEDICIÓN", "EXPEDICION"], DATE_PATTERN, size=1)
+
+
+def extract_clave_elector(lines):
+    def has_valid_date(clave):
+        try:
+            datetime.strptime(clave[6:12], "%y%m%d")
+        except ValueError:
+            return False
+        return True
+
+    return _unique(
+        match.group(0)
+        for line in lines
+        for match in CLAVE_ELECTOR_PATTERN.finditer(line)
+        if has_valid_date(match.group(0))
+    )
+
+
+def extract_fecha_nacimiento(lines):
+    return _first_labeled(lines, ["FECHA DE NACIMIENTO"], re.compile(r"\d{2}/\d{2}/\d{4}"), size=1)
+
+
+def extract_vigencia(lines):
+    for window in _windows(lines, ["VIGENCIA"], size=1):
+        match = YEAR_RANGE_PATTERN.search(window)
+        if match:
+            return match.group(2) or match.group(1)
+    return None
+
+
+def extract_vigente(lines):
+    vigencia = extract_vigencia(lines)
+    if vigencia is None:
+        return None
+    return int(vigencia) >= datetime.now().year
+
+
+def extract_placa(lines):
+    def is_placa(value):
+        compact = value.replace("-", "")
+        return 5 <= len(compact) <= 8 and bool(re.search(r"\d", compact)) and bool(re.search(r"[A-Z]", compact))
+
+    placa = _first_labeled(lines, ["PLACA"], PLACA_PATTERN, is_placa, size=1)
+    return placa.replace("-", "") if placa else None
+
+
+class FieldExtractor:
+    """
+    Deterministic extractor for the fields of rigid format (NIV, RFC, folio fiscal,
+    clave de elector, dates, placa), applied to the OCR text before calling the LLM.
+
+    A field is only reported when its value passes its format checks (check digits for
+    NIV and RFC, valid dates) and is unambiguous; everything else is left to the LLM.
+
+    Attributes:
+        rules (dict): Maps each field name to a function that takes the uppercase text
+            lines and returns the value or None.
+    """
+
+    rules = {
+        "NIV": extract_niv,
+        "Folio Fiscal": extract_folio_fiscal,
+        "RFC Receptor": extract_rfc_receptor,
+        "RFC Emisor": extract_rfc_emisor,
+        "Fecha Certificación": extract_fecha_certificacion,
+        "Fecha Expedición": extract_fecha_expedicion_factura,
+        "Fecha de expedición": extract_fecha_expedicion,
+        "Clave de elector": extract_clave_elector,
+        "Fecha de nacimiento": extract_fecha_nacimiento,
+        "Vigencia": extract_vigencia,
+        "Vigente": extract_vigente,
+        "Placa": extract_placa,
+    }
+
+    def extract(self, texto, campos):
+        """
+        Extracts the requested fields that have a deterministic rule.
+
+        Args:
+            texto (str): OCR text of the document, one line per row.
+            campos (list of str): Names of the requested fields.
+
+        Returns:
+            dict: Maps the fields found to their values. Missing fields are not included.
+        """
+        lines = [line.strip().upper() for line in texto.splitlines() if line.strip()]
+        encontrados = {}
+        for campo in campos:
+            rule = self.rules.get(campo)
+            value = rule(lines) if rule else None
+            if value is not None:
+                encontrados[campo] = value
+        return encontrados
@@ -0,0 +1,255 @@
+import os
+import threading
+
+from google import genai
+from google.genai import types
+
+from ResilientCall import get_caller
+from RateLimiter import get_rate_limiter, estimate_request_tokens, current_priority, current_case_usage
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+_clients = {}
+_clients_lock = threading.Lock()
+_transport = None
+_base_url = None
+
+
+def set_transport(transport=None, base_url=None):
+    """
+    Replaces the HTTP transport used by every Gemini client, e.g. to send requests to
+    a local mock server in tests. Clients created before the call are discarded.
+
+    Args:
+        transport (httpx.BaseTransport, optional): Transport given to the underlying
+            httpx client. None restores the default network transport.
+        base_url (str, optional): API endpoint. Defaults to GEMINI_BASE_URL or Google's.
+    """
+    global _transport, _base_url
+    with _clients_lock:
+        _transport = transport
+        _base_url = base_url
+        _clients.clear()
+
+
+def _base_url_setting():
+    return _base_url or os.getenv("GEMINI_BASE_URL") or None
+
+
+def _http_options():
+    client_args = {"transport": _transport} if _transport is not None else None
+    # The HTTP timeout (milliseconds) ends requests abandoned by the resilient caller
+    timeout = int(get_caller().timeout * 1000)
+    return types.HttpOptions(base_url=_base_url_setting(), client_args=client_args, timeout=timeout)
+
+
+def get_client(api_key):
+    """
+    Returns the process-wide Gemini client for `api_key`, creating it on first use.
+
+    The client keeps its HTTP connections open between requests and is safe to share
+    between threads, so every extractor and the ruling reuse the same TLS sessions.
+
+    Args:
+        api_key (str): API key for Gemini.
+
+    Returns:
+        genai.Client: The shared client.
+    """
+    with _clients_lock:
+        key = (api_key, _base_url_setting())
+        client = _clients.get(key)
+        if client is None:
+            client = genai.Client(api_key=api_key, http_options=_http_options())
+            _clients[key] = client
+        return client
+
+
+class _Metering:
+    """
+    Rate limiting and token accounting of the attempts of one request.
+
+    The limiter, priority and case totals are read in the calling thread, because the
+    attempts run in the resilient caller's threads, which do not share its context.
+    """
+
+    def __init__(self, contents, config):
+        self.limiter = get_rate_limiter()
+        self.priority = current_priority()
+        self.case_usage = current_case_usage()
+        self.estimated = estimate_request_tokens(contents, config)
+
+    def acquire(self, timeout):
+        """
+        Waits at most `timeout` seconds for the turn of one attempt. Given to the
+        resilient caller, which waits before starting the attempt's timeout.
+
+        Returns:
+            bool: True if the attempt may be sent.
+        """
+        return self.limiter is None or self.limiter.acquire(self.estimated, self.priority, timeout=timeout)
+
+    def settle(self, usage_metadata, failed=False):
+        """
+        Corrects the limiter with the usage of an attempt and adds it to the case
+        totals. A failed attempt returns its reserved tokens.
+        """
+        if self.limiter is not None:
+            actual = 0 if failed else getattr(usage_metadata, "total_token_count", None)
+            self.limiter.settle(self.estimated, actual)
+        if self.case_usage is not None and not failed:
+            self.case_usage.add(usage_metadata)
+
+
+def generate_content(api_key, contents, model=None, config=None):
+    """
+    Sends a generateContent request through the shared client.
+
+    The request is made by the resilient caller: it is retried with backoff on rate
+    limits, server errors and timeouts, within GEMINI_DEADLINE, and fails fast with
+    CircuitOpenError while Gemini keeps failing. Every attempt, retries and hedged
+    copies included, first waits its turn in the rate limiter (see RateLimiter.py),
+    within GEMINI_DEADLINE and before its timeout starts, failing with QueueTimeout if
+    none comes; its token usage is added to the current case.
+
+    Args:
+        api_key (str): API key for Gemini.
+        contents (str or list): Prompt contents.
+        model (str, optional): Model name. Defaults to GEMINI_MODEL or 'gemini-2.0-flash'.
+        config (types.GenerateContentConfig, optional): Generation settings.
+
+    Returns:
+        genai.types.GenerateContentResponse: The response generated by the model.
+    """
+    client = get_client(api_key)
+    metering = _Metering(contents, config)
+
+    def attempt():
+        try:
+            response = client.models.generate_content(model=model or GEMINI_MODEL, contents=contents, config=config)
+        except Exception:
+            metering.settle(None, failed=True)
+            raise
+        metering.settle(response.usage_metadata)
+        return response
+
+    return get_caller().call(attempt, acquire=metering.acquire)
+
+
+def generate_content_stream(api_key, contents, model=None, config=None):
+    """
+    Sends a streamGenerateContent request through the shared client.
+
+    The stream is opened by the resilient caller, which waits for the first chunk, so
+    retries, the circuit breaker and the rate limiter apply until the model starts
+    answering; an error in the middle of the stream is raised to the reader. The usage
+    is accounted when the stream ends or is closed.
+
+    Args:
+        api_key (str): API key for Gemini.
+        contents (str or list): Prompt contents.
+        model (str, optional): Model name. Defaults to GEMINI_MODEL or 'gemini-2.0-flash'.
+        config (types.GenerateContentConfig, optional): Generation settings.
+
+    Returns:
+        iterator of genai.types.GenerateContentResponse: The response chunks.
+    """
+    client = get_client(api_key)
+    metering = _Metering(contents, config)
+
+    def open_stream():
+        try:
+            stream = client.models.generate_content_stream(model=model or GEMINI_MODEL, contents=contents, config=config)
+            first = next(stream, None)
+        except Exception:
+            metering.settle(None, failed=True)
+            raise
+        return first, stream
+
+    # A stream that lost the hedge, or came after its timeout, is closed and accounted
+    first, stream = get_caller().call(
+        open_stream, on_discard=lambda opened: _MeteredStream(*opened, metering).close(), acquire=metering.acquire
+    )
+    return _MeteredStream(first, stream, metering)
+
+
+class _MeteredStream:
+    """
+    Iterator over the chunks of a stream that accounts its usage exactly once, when it
+    is exhausted, closed or garbage-collected, even if it was never read.
+    """
+
+    def __init__(self, first, stream, metering):
+        self._pending = [first] if first is not None else []
+        self._stream = stream
+        self._metering = metering
+        # The usage is reported with the last chunks
+        self._usage_metadata = first.usage_metadata if first is not None else None
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        try:
+            chunk = self._pending.pop() if self._pending else next(self._stream)
+        except Exception:  # StopIteration included
+            self.close()
+            raise
+        self._usage_metadata = chunk.usage_metadata or self._usage_metadata
+        return chunk
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._stream.close()
+        finally:
+            self._metering.settle(self._usage_metadata)
+
+    def __del__(self):
+        self.close()
+
+
+def generate_with_system(api_key, system_message, contents, model=None, config=None, stream=False):
+    """
+    Sends a generateContent request with the static instructions as its system
+    instruction, apart from the per-request input.
+
+    The system prompts of the app are shorter than the 1,024 tokens Gemini requires for
+    explicit context caching, so they travel with every request.
+
+    Args:
+        api_key (str): API key for Gemini.
+        system_message (str): Static instructions, identical across requests.
+        contents (str or list): Per-request input.
+        model (str, optional): Model name. Defaults to GEMINI_MODEL.
+        config (types.GenerateContentConfig, optional): Generation settings.
+        stream (bool): Return the response as an iterator of chunks.
+
+    Returns:
+        genai.types.GenerateContentResponse or iterator: The response generated by the
+        model, or its chunks if `stream` is True.
+    """
+    if config is None:
+        config = types.GenerateContentConfig(system_instruction=system_message)
+    else:
+        config = config.model_copy(update={"system_instruction": system_message})
+    generate = generate_content_stream if stream else generate_content
+    return generate(api_key, contents, model=model, config=config)
+
+
+def response_text(response):
+    """
+    Returns the text generated in the first candidate of a response.
+
+    Args:
+        response (genai.types.GenerateContentResponse): Response from the Gemini API.
+
+    Returns:
+        str: The generated text.
+    """
+    return response.candidates[0].content.parts[0].text
@@ -0,0 +1,209 @@
+import os
+import json
+import argparse
+
+import numpy as np
+from PageCache import get_page_cache
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(__file__), "models", "layout_index.npz")
+
+# Pages are fingerprinted from a very coarse render; layouts survive, text does not
+FINGERPRINT_DPI = 36
+GRID_SIZE = 32
+
+# Number of set bits of every byte value, to count Hamming distances on packed bits
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint16)
+
+
+def layout_fingerprint(gray, grid_size=GRID_SIZE):
+    """
+    Computes the layout fingerprint of a grayscale page.
+
+    The page is averaged down to a `grid_size` x `grid_size` grid and every cell is set
+    to 1 when it is darker than the median cell, which keeps the position of photos,
+    logos, tables and text blocks while ignoring the actual text and scan noise.
+
+    Args:
+        gray (np.ndarray): Grayscale page (H x W, uint8).
+        grid_size (int): Cells per side of the grid.
+
+    Returns:
+        np.ndarray: Packed fingerprint bits (grid_size * grid_size / 8 bytes, uint8).
+    """
+    gray = np.asarray(gray, dtype=np.float32)
+    rows = np.linspace(0, gray.shape[0], grid_size + 1).astype(int)[:-1]
+    cols = np.linspace(0, gray.shape[1], grid_size + 1).astype(int)[:-1]
+    sums = np.add.reduceat(np.add.reduceat(gray, rows, axis=0), cols, axis=1)
+    counts = np.outer(np.diff(np.append(rows, gray.shape[0])), np.diff(np.append(cols, gray.shape[1])))
+    cells = sums / counts
+    return np.packbits(cells < np.median(cells))
+
+
+def page_fingerprint(pdf_path, page=0):
+    """
+    Renders the page through the shared page cache and returns its fingerprint.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        page (int): Zero-based page index.
+
+    Returns:
+        np.ndarray: Packed fingerprint bits.
+    """
+    return layout_fingerprint(get_page_cache().get(pdf_path, page=page, dpi=FINGERPRINT_DPI, colorspace="GRAY"))
+
+
+class LayoutIndex:
+    """
+    Nearest-neighbour index of layout fingerprints of labeled pages.
+
+    A page is matched only when its nearest fingerprint is close enough and the nearest
+    fingerprint of any other document type is clearly farther away; ambiguous and
+    unknown layouts are left to OCR and the text classifier.
+
+    Attributes:
+        bits (np.ndarray): Packed fingerprints, one row per labeled page.
+        labels (np.ndarray): Document type of every row.
+        max_distance (float): Maximum Hamming distance to the nearest page, as a
+            fraction of the fingerprint bits.
+        min_margin (float): Minimum gap between the nearest page and the nearest page of
+            another type, as a fraction of the fingerprint bits.
+    """
+
+    def __init__(self, bits, labels, max_distance=0.12, min_margin=0.06):
+        self.bits = np.asarray(bits, dtype=np.uint8)
+        self.labels = np.asarray(labels)
+        self.max_distance = max_distance
+        self.min_margin = min_margin
+        self.n_bits = self.bits.shape[1] * 8
+
+    def distances(self, fingerprint):
+        """
+        Returns the Hamming distance from `fingerprint` to every indexed page.
+
+        Args:
+            fingerprint (np.ndarray): Packed fingerprint bits.
+
+        Returns:
+            np.ndarray: One distance per indexed page.
+        """
+        return _POPCOUNT[np.bitwise_xor(self.bits, fingerprint)].sum(axis=1)
+
+    def match(self, fingerprint):
+        """
+        Finds the document type of a page from its fingerprint.
+
+        Args:
+            fingerprint (np.ndarray): Packed fingerprint bits.
+
+        Returns:
+            tuple: (document type or None, confidence between 0 and 1). The type is None
+            when the page is unknown or ambiguous.
+        """
+        if not len(self.labels):
+            return None, 0.0
+        distances = self.distances(fingerprint)
+        nearest = int(distances.argmin())
+        doc_type = self.labels[nearest]
+        others = distances[self.labels != doc_type]
+        runner_up = int(others.min()) if len(others) else self.n_bits
+
+        confidence = 1 - distances[nearest] / self.n_bits
+        if distances[nearest] > self.max_distance * self.n_bits:
+            return None, confidence
+        if runner_up - distances[nearest] < self.min_margin * self.n_bits:
+            return None, confidence
+        return str(doc_type), confidence
+
+    @classmethod
+    def build(cls, labeled_pdfs):
+        """
+        Builds the index from labeled PDFs.
+
+        Args:
+            labeled_pdfs (iterable of tuple): (path to the PDF, document type) pairs.
+
+        Returns:
+            LayoutIndex: The index.
+        """
+        bits, labels = [], []
+        for pdf_path, label in labeled_pdfs:
+            bits.append(page_fingerprint(pdf_path))
+            labels.append(label)
+        if not bits:
+            return cls(np.zeros((0, GRID_SIZE * GRID_SIZE // 8), dtype=np.uint8), labels)
+        return cls(np.stack(bits), labels)
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        """
+        Stores the index as a compressed .npz file.
+
+        Args:
+            path (str): Destination file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(path, bits=self.bits, labels=self.labels)
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH):
+        """
+        Loads an index stored with `save`.
+
+        Args:
+            path (str): Index file.
+
+        Returns:
+            LayoutIndex: The loaded index.
+        """
+        with np.load(path) as data:
+            return cls(data["bits"], data["labels"])
+
+
+_index = None
+
+
+def get_layout_index(path=None):
+    """
+    Returns the process-wide layout index, loading it on first use.
+
+    Args:
+        path (str, optional): Index file. Defaults to LAYOUT_INDEX_PATH or
+            models/layout_index.npz.
+
+    Returns:
+        LayoutIndex or None: The index, or None if LAYOUT_INDEX=0 or the file does not exist.
+    """
+    global _index
+    if os.getenv("LAYOUT_INDEX", "1") == "0":
+        return None
+    if _index is None:
+        path = path or os.getenv("LAYOUT_INDEX_PATH") or DEFAULT_INDEX_PATH
+        if not os.path.isfile(path):
+            return None
+        _index = LayoutIndex.load(path)
+    return _index
+
+
+def main():
+    from StatisticalClassifier import iter_labeled_pdfs
+
+    parser = argparse.ArgumentParser(description="Construye el índice de huellas de diseño de página.")
+    parser.add_argument("paths", nargs="+", help="Carpetas o archivos .zip de casos")
+    parser.add_argument("--labels", help="JSON que asigna el tipo de documento a cada nombre de archivo")
+    parser.add_argument("--output", default=DEFAULT_INDEX_PATH, help="Archivo .npz de salida")
+    args = parser.parse_args()
+
+    labels = {}
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as labels_file:
+            labels = json.load(labels_file)
+
+    index = LayoutIndex.build(iter_labeled_pdfs(args.paths, labels))
+    if not len(index.labels):
+        raise SystemExit("No se encontraron documentos etiquetados.")
+    index.save(args.output)
+    print(f"{len(index.labels)} páginas indexadas en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from itertools import product
+
+TD1_LINE_LENGTH = 30
+
+# Characters OCR engines confuse in the MRZ font, in both directions
+_TO_DIGIT = str.maketrans("OQDIBSZG", "00018526")
+_TO_LETTER = str.maketrans("01852", "OIBSZ")
+_AMBIGUOUS = {"0": "O", "O": "0", "1": "I", "I": "1", "8": "B", "B": "8", "5": "S", "S": "5"}
+
+# Alphanumeric fields with more ambiguous characters than this are not brute-forced
+_MAX_AMBIGUOUS = 8
+
+
+def check_digit(value):
+    """
+    Computes the ICAO 9303 check digit of an MRZ field.
+
+    Args:
+        value (str): Field characters (digits, A-Z and '<').
+
+    Returns:
+        str: The check digit.
+    """
+    total = 0
+    for i, char in enumerate(value):
+        if char.isdigit():
+            number = int(char)
+        elif "A" <= char <= "Z":
+            number = ord(char) - 55
+        else:
+            number = 0
+        total += number * (7, 3, 1)[i % 3]
+    return str(total % 10)
+
+
+def _correct_numeric(value, check):
+    """
+    Reads a numeric field and its check digit as digits.
+
+    Returns:
+        tuple: (corrected value, corrected check digit, True if the check digit matches).
+    """
+    value, check = value.translate(_TO_DIGIT), check.translate(_TO_DIGIT)
+    return value, check, check_digit(value) == check
+
+
+def _correct_alphanumeric(value, check):
+    """
+    Tries the alternative readings of the ambiguous characters of an alphanumeric field
+    until one matches its check digit.
+
+    Returns:
+        tuple: (corrected value, corrected check digit, True if the check digit matches).
+    """
+    check = check.translate(_TO_DIGIT)
+    positions = [i for i, char in enumerate(value) if char in _AMBIGUOUS]
+    if len(positions) <= _MAX_AMBIGUOUS:
+        for choice in product((False, True), repeat=len(positions)):
+            chars = list(value)
+            for position, swap in zip(positions, choice):
+                if swap:
+                    chars[position] = _AMBIGUOUS[chars[position]]
+            candidate = "".join(chars)
+            if check_digit(candidate) == check:
+                return candidate, check, True
+    return value, check, False
+
+
+def _parse_date(yymmdd, future=False):
+    """
+    Converts an MRZ date into a date. Birth dates are never in the future; expiry
+    dates always are in this century.
+    """
+    try:
+        parsed = datetime.strptime(yymmdd, "%y%m%d").date()
+    except ValueError:
+        return None
+    if future:
+        return parsed.replace(year=2000 + parsed.year % 100)
+    if parsed > date.today():
+        parsed = parsed.replace(year=parsed.year - 100)
+    return parsed
+
+
+def _normalize(line):
+    line = line.upper().replace(" ", "").replace("«", "<")
+    return re.sub(r"[^A-Z0-9<]", "<", line)
+
+
+@dataclass
+class MRZData:
+    """
+    Fields decoded from the TD1 machine-readable zone on the back of the INE.
+
+    Attributes:
+        document_number (str): Document number (CIC).
+        birth_date (date or None): Date of birth.
+        expiry_date (date or None): Expiry date.
+        sex (str): 'H', 'M' or '<'.
+        surnames (str): Paternal and maternal surnames, separated by a space.
+        given_names (str): Given names, separated by spaces.
+        valid (bool): True if every check digit, including the composite one, matches.
+    """
+    document_number: str
+    birth_date: date
+    expiry_date: date
+    sex: str
+    surnames: str
+    given_names: str
+    valid: bool
+
+    @property
+    def full_name(self):
+        """
+        Name in the order used on the INE front: PATERNO MATERNO NOMBRES.
+        """
+        return f"{self.surnames} {self.given_names}".strip()
+
+    def to_ine_fields(self):
+        """
+        Returns the decoded values protected by check digits, with the keys of
+        `INEDataExtractor`.
+
+        The name is left out: line 3 has no check digit, is cut at 30 characters and
+        drops accents and Ñ, so the front side remains the source of the name.
+
+        Returns:
+            dict: Keys 'Fecha de nacimiento', 'Vigencia' and 'Vigente', when decoded.
+        """
+        campos = {}
+        if self.birth_date:
+            campos["Fecha de nacimiento"] = self.birth_date.strftime("%d/%m/%Y")
+        if self.expiry_date:
+            campos["Vigencia"] = str(self.expiry_date.year)
+            campos["Vigente"] = self.expiry_date >= date.today()
+        return campos
+
+
+def parse_td1(lines):
+    """
+    Finds and decodes the three-line TD1 zone ('IDMEX...') in OCR lines.
+
+    Numeric fields are read as digits and name fields as letters; ambiguous characters
+    of the document number are resolved with its check digit.
+
+    Args:
+        lines (list of str): OCR text lines of the INE back side.
+
+    Returns:
+        MRZData or None: The decoded zone, or None if no TD1 zone is found.
+    """
+    normalized = [_normalize(line) for line in lines if line.strip()]
+    start = next(
+        (i for i, line in enumerate(normalized) if line[:5].translate(_TO_LETTER) == "IDMEX"),
+        None,
+    )
+    if start is None or start + 2 >= len(normalized):
+        return None
+    line1, line2, line3 = (
+        line[:TD1_LINE_LENGTH].ljust(TD1_LINE_LENGTH, "<") for line in normalized[start:start + 3]
+    )
+
+    document_number, document_check, document_ok = _correct_alphanumeric(line1[5:14], line1[14])
+    birth, birth_check, birth_ok = _correct_numeric(line2[0:6], line2[6])
+    expiry, expiry_check, expiry_ok = _correct_numeric(line2[8:14], line2[14])
+    # The optional data of the INE is numeric; it is retried as digits if the raw reading fails
+    composite_check = line2[29].translate(_TO_DIGIT)
+    composite_ok = any(
+        check_digit(document_number + document_check + optional1 + birth + birth_check + expiry + expiry_check + optional2)
+        == composite_check
+        for optional1, optional2 in (
+            (line1[15:30], line2[18:29]),
+            (line1[15:30].translate(_TO_DIGIT), line2[18:29].translate(_TO_DIGIT)),
+        )
+    )
+
+    names = line3.translate(_TO_LETTER).rstrip("<")
+    surnames, _, given_names = names.partition("<<")
+
+    return MRZData(
+        document_number=document_number.replace("<", ""),
+        birth_date=_parse_date(birth) if birth_ok else None,
+        expiry_date=_parse_date(expiry, future=True) if expiry_ok else None,
+        sex=line2[7].translate(_TO_LETTER),
+        surnames=" ".join(part for part in surnames.split("<") if part),
+        given_names=" ".join(part for part in given_names.split("<") if part),
+        valid=document_ok and birth_ok and expiry_ok and composite_ok,
+    )
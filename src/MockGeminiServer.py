@@ -0,0 +1,410 @@
+import os
+import re
+import json
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from PromptCompaction import estimate_tokens
+
+ROUTE_PATTERN = re.compile(r"^/(?P<version>v1\w*)/(?:(?P<cached>cachedContents)(?:/(?P<cache_id>[\w-]+))?|models/(?P<model>[\w.-]+):(?P<method>generateContent|streamGenerateContent))$")
+
+STATUS_NAMES = {400: "INVALID_ARGUMENT", 404: "NOT_FOUND", 429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE"}
+
+
+def _text_of(content):
+    if not content:
+        return ""
+    if isinstance(content, list):
+        return "\n".join(_text_of(item) for item in content)
+    return "".join(part.get("text", "") for part in content.get("parts", []))
+
+
+def _placeholder(schema):
+    """
+    Builds a value that satisfies a response schema, for requests with no recording.
+    """
+    kind = (schema or {}).get("type", "STRING").upper()
+    if kind == "OBJECT":
+        properties = schema.get("properties", {})
+        order = schema.get("propertyOrdering") or list(properties)
+        return {name: _placeholder(properties[name]) for name in order}
+    if kind == "BOOLEAN":
+        return False
+    if kind == "ARRAY":
+        return []
+    if kind in ("NUMBER", "INTEGER"):
+        return 0
+    return schema["enum"][0] if schema and schema.get("enum") else "N/A"
+
+
+class MockGeminiServer:
+    """
+    Local stand-in for the subset of the Gemini API the app uses: generateContent,
+    streamGenerateContent (server-sent events) and cachedContents.
+
+    Responses are served from recordings keyed by the request (model, system prompt,
+    contents and generation settings). Requests with no recording get a placeholder
+    answer that fits their response schema. With `upstream`, requests with no
+    recording are forwarded to the real API and recorded, so the recordings of the
+    sample cases can be captured once online and replayed offline.
+
+    Latency, jitter, server errors and rate limiting are injected from a seeded random
+    generator, so a benchmark run is reproducible. Responses report a usageMetadata
+    estimated from the request and answer texts, so token accounting can be exercised.
+
+    Attributes:
+        recordings (dict): Maps request keys to response texts.
+        latency (float): Mean seconds before answering.
+        jitter (float): Maximum seconds added to or subtracted from the latency.
+        error_rate (float): Fraction of requests answered with a 500 or 503 error.
+        rpm (int or None): Requests per minute before answering 429.
+        stats (dict): Counts of requests, recorded hits, errors and rate-limited calls.
+    """
+
+    def __init__(self, recordings=None, latency=0.0, jitter=0.0, error_rate=0.0, rpm=None, seed=0,
+                 host="127.0.0.1", port=0, upstream=None, api_key=None):
+        self.recordings = dict(recordings or {})
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.api_key = api_key
+        self.stats = {"requests": 0, "recorded": 0, "placeholder": 0, "forwarded": 0, "errors": 0, "rate_limited": 0}
+        self._random = random.Random(seed)
+        self._window = deque()
+        self._cached_contents = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        Serves requests in a background thread.
+
+        Returns:
+            str: Base URL to give to GeminiClient.set_transport or GEMINI_BASE_URL.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def serve_forever(self):
+        """
+        Serves requests in the current thread until interrupted.
+        """
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @staticmethod
+    def load_recordings(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_recordings(self, path):
+        with self._lock:
+            recordings = dict(self.recordings)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(recordings, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+    def _cached_content(self, name):
+        """
+        Returns a cached content, or None if it does not exist or its expireTime has
+        passed, as the real API answers 404 for expired caches.
+        """
+        with self._lock:
+            cached = self._cached_contents.get(name)
+            if cached is None:
+                return None
+            expire_time = datetime.fromisoformat(cached["expireTime"].replace("Z", "+00:00"))
+            if datetime.now(timezone.utc) >= expire_time:
+                del self._cached_contents[name]
+                return None
+            return cached
+
+    def _inline_cached_content(self, body):
+        """
+        Replaces a cachedContent reference with its system instruction, so requests hash
+        (and are forwarded) the same with and without context caching.
+        """
+        name = body.pop("cachedContent", None)
+        if name:
+            cached = self._cached_content(name)
+            if cached is None:
+                return None
+            body["systemInstruction"] = cached.get("systemInstruction")
+        return body
+
+    @staticmethod
+    def request_key(model, body):
+        """
+        Builds the recording key of a generateContent request.
+
+        Args:
+            model (str): Model name in the URL.
+            body (dict): Request body, with any cachedContent already inlined.
+
+        Returns:
+            str: Hex digest of the model, system prompt, contents and generation settings.
+        """
+        payload = json.dumps(
+            [model, _text_of(body.get("systemInstruction")), _text_of(body.get("contents")), body.get("generationConfig")],
+            ensure_ascii=False, sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _inject(self):
+        """
+        Decides the fault of a request.
+
+        Returns:
+            tuple: (delay in seconds, HTTP error status or None).
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            if self.rpm:
+                now = time.monotonic()
+                while self._window and now - self._window[0] > 60:
+                    self._window.popleft()
+                if len(self._window) >= self.rpm:
+                    self.stats["rate_limited"] += 1
+                    return 0.0, 429
+                self._window.append(now)
+            if self._random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return delay, self._random.choice((500, 503))
+        return delay, None
+
+    def _forward(self, model, body):
+        request = urllib.request.Request(
+            f"{self.upstream}/v1beta/models/{model}:generateContent",
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json", "x-goog-api-key": self.api_key or ""},
+        )
+        with urllib.request.urlopen(request, timeout=120) as response:
+            answer = json.load(response)
+        return answer["candidates"][0]["content"]["parts"][0]["text"]
+
+    def _answer(self, model, body):
+        """
+        Returns the text of a generateContent request: recorded, forwarded or placeholder.
+        """
+        key = self.request_key(model, body)
+        with self._lock:
+            text = self.recordings.get(key)
+        if text is not None:
+            with self._lock:
+                self.stats["recorded"] += 1
+            return text
+        if self.upstream:
+            text = self._forward(model, body)
+            with self._lock:
+                self.recordings[key] = text
+                self.stats["forwarded"] += 1
+            return text
+
+        with self._lock:
+            self.stats["placeholder"] += 1
+        config = body.get("generationConfig") or {}
+        if config.get("responseSchema"):
+            return json.dumps(_placeholder(config["responseSchema"]), ensure_ascii=False)
+        if config.get("responseMimeType") == "application/json":
+            return "{}"
+        return "Respuesta simulada del servidor local de Gemini."
+
+    @staticmethod
+    def _usage(body, text, cached):
+        """
+        Estimates the usageMetadata of a request, with the same four characters per
+        token as the app's estimates. The system instruction of a cachedContent is
+        reported as cached input.
+        """
+        system_tokens = estimate_tokens(_text_of(body.get("systemInstruction")))
+        prompt_tokens = system_tokens + estimate_tokens(_text_of(body.get("contents")))
+        output_tokens = estimate_tokens(text)
+        usage = {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        }
+        if cached:
+            usage["cachedContentTokenCount"] = system_tokens
+        return usage
+
+    @staticmethod
+    def _response(text, finish=True, usage=None):
+        candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+        if finish:
+            candidate["finishReason"] = "STOP"
+        response = {"candidates": [candidate], "modelVersion": "mock"}
+        if usage is not None:
+            response["usageMetadata"] = usage
+        return response
+
+    def _create_cached_content(self, body):
+        ttl = float(str(body.get("ttl", "3600s")).rstrip("s"))
+        now = datetime.now(timezone.utc)
+        name = f"cachedContents/{uuid.uuid4().hex[:16]}"
+        cached = {
+            "name": name,
+            "model": body.get("model"),
+            "displayName": body.get("displayName", ""),
+            "systemInstruction": body.get("systemInstruction"),
+            "createTime": now.isoformat().replace("+00:00", "Z"),
+            "expireTime": (now + timedelta(seconds=ttl)).isoformat().replace("+00:00", "Z"),
+        }
+        with self._lock:
+            self._cached_contents[name] = cached
+        return {key: value for key, value in cached.items() if key != "systemInstruction"}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_error(self, status, message):
+                self._send_json(status, {"error": {"code": status, "message": message, "status": STATUS_NAMES.get(status, "UNKNOWN")}})
+
+            def _read_body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def _route(self):
+                return ROUTE_PATTERN.match(self.path.split("?", 1)[0])
+
+            def do_GET(self):
+                route = self._route()
+                if not route or not route.group("cache_id"):
+                    return self._send_error(404, f"Ruta no soportada: {self.path}")
+                cached = server._cached_content(f"cachedContents/{route.group('cache_id')}")
+                if cached is None:
+                    return self._send_error(404, "CachedContent not found")
+                self._send_json(200, {key: value for key, value in cached.items() if key != "systemInstruction"})
+
+            def do_DELETE(self):
+                route = self._route()
+                if route and route.group("cache_id"):
+                    server._cached_contents.pop(f"cachedContents/{route.group('cache_id')}", None)
+                self._send_json(200, {})
+
+            def do_POST(self):
+                route = self._route()
+                if not route:
+                    return self._send_error(404, f"Ruta no soportada: {self.path}")
+                body = self._read_body()
+                if route.group("cached"):
+                    return self._send_json(200, server._create_cached_content(body))
+
+                delay, status = server._inject()
+                time.sleep(delay)
+                if status is not None:
+                    return self._send_error(status, "Error inyectado por el servidor local")
+                cached = bool(body.get("cachedContent"))
+                body = server._inline_cached_content(body)
+                if body is None:
+                    return self._send_error(404, "CachedContent not found")
+                try:
+                    text = server._answer(route.group("model"), body)
+                except (urllib.error.URLError, KeyError, ValueError) as e:
+                    return self._send_error(500, f"No se pudo grabar la respuesta: {e}")
+
+                usage = server._usage(body, text, cached)
+                if route.group("method") == "generateContent":
+                    return self._send_json(200, server._response(text, usage=usage))
+
+                # Server-sent events, a few characters per chunk
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                size = max(1, len(text) // 8)
+                pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+                for i, piece in enumerate(pieces):
+                    # As the real API, the usage is complete in the last chunk
+                    last = i == len(pieces) - 1
+                    chunk = server._response(piece, finish=last, usage=usage if last else None)
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(server.jitter / len(pieces))
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    """
+    Runs the server until interrupted. Point the app at it with
+    GEMINI_BASE_URL=http://127.0.0.1:<port>.
+    """
+    parser = argparse.ArgumentParser(description="Servidor local compatible con la API de Gemini.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--recordings", default=None, help="Archivo JSON de respuestas grabadas")
+    parser.add_argument("--record", action="store_true", help="Reenvía a Gemini lo no grabado y lo guarda en --recordings")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latencia media en segundos")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variación máxima de la latencia en segundos")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 500/503")
+    parser.add_argument("--rpm", type=int, default=None, help="Solicitudes por minuto antes de responder 429")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.record and not args.recordings:
+        parser.error("--record requiere --recordings para guardar las respuestas")
+
+    recordings = MockGeminiServer.load_recordings(args.recordings) if args.recordings and os.path.exists(args.recordings) else {}
+    server = MockGeminiServer(
+        recordings, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, rpm=args.rpm,
+        seed=args.seed, port=args.port,
+        upstream="https://generativelanguage.googleapis.com" if args.record else None,
+        api_key=os.getenv("GEMINI_API_KEY"),
+    )
+    print(f"Servidor local de Gemini en {server.url}")
+    server.serve_forever()
+    if args.record:
+        server.save_recordings(args.recordings)
+    print(json.dumps(server.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,318 @@
 import os
-import pathlib
-import Quartz
-import Vision
-from Cocoa import NSURL
-from Foundation import NSDictionary
-from wurlitzer import pipes
-from pdf2image import convert_from_path
+import sys
+import threading
+from dataclasses import dataclass
+from typing import List, Protocol, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+from PageCache import get_page_cache
+
+
+@dataclass
+class TextLine:
+    """
+    A line of text recognized by an OCR engine.
+
+    Attributes:
+        text (str): Recognized text.
+        box (tuple): Bounding box (x0, y0, x1, y1) in pixels, origin at the top-left corner.
+        confidence (float): Recognition confidence between 0 and 1.
+    """
+    text: str
+    box: Tuple[float, float, float, float]
+    confidence: float
+
+
+class OCREngine(Protocol):
+    """
+    Interface every OCR backend implements.
+
+    Attributes:
+        name (str): Engine identifier used in the configuration.
+        version (str): Engine version, part of the OCR cache key.
+        settings (dict): Settings that change the output, part of the OCR cache key.
+    """
+    name: str
+    version: str
+    settings: dict
+
+    def recognize(self, image) -> List[TextLine]:
+        """
+        Recognizes the text of a single image (array, PIL image or file path).
+        """
+        ...
+
+    def recognize_batch(self, images: Sequence) -> List[List[TextLine]]:
+        """
+        Recognizes several images in one call, reusing the loaded engine.
+        """
+        ...
+
+
+def _to_pil(image):
+    """
+    Converts an array or file path into a PIL image.
+    """
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, np.ndarray):
+        return Image.fromarray(image)
+    return Image.open(image)
+
+
+class TesseractEngine:
+    """
+    Local OCR backend based on Tesseract, running in-process through tesserocr.
+
+    The Tesseract model is loaded once when the engine is created and reused for
+    every page, so batches only pay the recognition cost.
+    """
+
+    name = "tesseract"
+
+    def __init__(self, lang=None, psm=3):
+        """
+        Initializes the Tesseract API.
+
+        Args:
+            lang (str, optional): Tesseract language code. Defaults to 'spa'.
+            psm (int): Page segmentation mode. Defaults to fully automatic segmentation.
+        """
+        import tesserocr
+        self._tesserocr = tesserocr
+        lang = lang or "spa"
+        self.settings = {"lang": lang, "psm": psm}
+        self.version = tesserocr.tesseract_version().splitlines()[0]
+        self._api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+        self._lock = threading.Lock()
+
+    def recognize(self, image):
+        level = self._tesserocr.RIL.TEXTLINE
+        lines = []
+        with self._lock:
+            self._api.SetImage(_to_pil(image))
+            self._api.Recognize()
+            iterator = self._api.GetIterator()
+            if iterator is None:
+                return lines
+            for result in self._tesserocr.iterate_level(iterator, level):
+                text = (result.GetUTF8Text(level) or "").strip()
+                box = result.BoundingBox(level)
+                if text and box:
+                    lines.append(TextLine(text, tuple(float(v) for v in box), result.Confidence(level) / 100))
+        return lines
+
+    def recognize_batch(self, images):
+        return [self.recognize(image) for image in images]
+
+
+class VisionEngine:
+    """
+    OCR backend based on Apple's Vision framework. Only available on macOS, where
+    pyobjc (Quartz, Vision, Cocoa) is installed.
+    """
+
+    name = "vision"
+
+    def __init__(self, lang=None):
+        """
+        Imports the Vision framework bindings.
+
+        Args:
+            lang (str, optional): Recognition language (currently unused, Vision picks it).
+        """
+        import platform
+        import Quartz
+        import Vision
+        from Foundation import NSData, NSDictionary
+        from wurlitzer import pipes
+
+        self._quartz = Quartz
+        self._vision = Vision
+        self._nsdata = NSData
+        self._nsdictionary = NSDictionary
+        self._pipes = pipes
+        self.settings = {"lang": lang}
+        self.version = platform.mac_ver()[0]
+
+    def _load_ciimage(self, image):
+        """
+        Builds a CIImage from an array, PIL image or path, encoding in memory when needed.
+        """
+        if isinstance(image, (str, os.PathLike)):
+            from Cocoa import NSURL
+            with self._pipes() as (out, err):
+                return self._quartz.CIImage.imageWithContentsOfURL_(NSURL.fileURLWithPath_(str(image)))
+
+        import io
+        buffer = io.BytesIO()
+        _to_pil(image).save(buffer, format="PNG")
+        data = self._nsdata.dataWithBytes_length_(buffer.getvalue(), buffer.tell())
+        with self._pipes() as (out, err):
+            return self._quartz.CIImage.imageWithData_(data)
+
+    def recognize(self, image):
+        input_image = self._load_ciimage(image)
+        extent = input_image.extent()
+        width, height = extent.size.width, extent.size.height
+
+        vision_options = self._nsdictionary.dictionaryWithDictionary_({})
+        vision_handler = self._vision.VNImageRequestHandler.alloc().initWithCIImage_options_(
+            input_image, vision_options
+        )
+        results = []
+        handler = self._make_request_handler(results, width, height)
+        vision_request = self._vision.VNRecognizeTextRequest.alloc().initWithCompletionHandler_(handler)
+        vision_handler.performRequests_error_([vision_request], None)
+
+        return results
+
+    def recognize_batch(self, images):
+        return [self.recognize(image) for image in images]
+
+    @staticmethod
+    def _make_request_handler(results, width, height):
+        """
+        Creates a handler function to process OCR results from a Vision text recognition request.
+
+        Parameters:
+            results (list): A list that will be populated with recognized TextLine objects.
+            width (float): Image width, used to convert normalized boxes to pixels.
+            height (float): Image height, used to convert normalized boxes to pixels.
+
+        Returns:
+            function: A handler function that takes `request` and `error` as parameters.
+
+        Raises:
+            ValueError: If `results` is not a list.
+        """
+        if not isinstance(results, list):
+            raise ValueError("results must be a list")
+
+        def handler(request, error):
+            if error:
+                print(f"Error! {error}")
+            else:
+                observations = request.results()
+                for text_observation in observations:
+                    recognized_text = text_observation.topCandidates_(1)[0]
+                    # Vision boxes are normalized with the origin at the bottom-left corner
+                    bbox = text_observation.boundingBox()
+                    x0 = bbox.origin.x * width
+                    x1 = (bbox.origin.x + bbox.size.width) * width
+                    y0 = (1 - bbox.origin.y - bbox.size.height) * height
+                    y1 = (1 - bbox.origin.y) * height
+                    results.append(TextLine(recognized_text.string(), (x0, y0, x1, y1), float(recognized_text.confidence())))
+        return handler
+
+
+OCR_ENGINES = {
+    TesseractEngine.name: TesseractEngine,
+    VisionEngine.name: VisionEngine,
+}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def register_ocr_engine(name, factory):
+    """
+    Registers an additional OCR backend so it can be selected by name.
+
+    Args:
+        name (str): Engine identifier.
+        factory (callable): Callable taking `lang` and returning an OCREngine.
+    """
+    OCR_ENGINES[name] = factory
+
+
+def default_ocr_engine_name():
+    """
+    Returns the engine selected by the OCR_ENGINE environment variable, or the
+    platform default: Vision on macOS and Tesseract elsewhere.
+    """
+    return os.getenv("OCR_ENGINE") or (VisionEngine.name if sys.platform == "darwin" else TesseractEngine.name)
+
+
+def create_ocr_engine(name=None, lang=None):
+    """
+    Loads a new engine instance, e.g. for a thread that must not wait for the
+    process-wide one.
+
+    Args:
+        name (str, optional): Engine identifier. Defaults to `default_ocr_engine_name()`.
+        lang (str, optional): Recognition language passed to the engine.
+
+    Returns:
+        OCREngine: The engine instance.
+
+    Raises:
+        ValueError: If the engine name is unknown.
+    """
+    name = name or default_ocr_engine_name()
+    if name not in OCR_ENGINES:
+        raise ValueError(f"Unknown OCR engine: {name}")
+    return OCR_ENGINES[name](lang=lang)
+
+
+def get_ocr_engine(name=None, lang=None):
+    """
+    Returns a process-wide engine instance, loading it only once.
+
+    Args:
+        name (str, optional): Engine identifier. Defaults to `default_ocr_engine_name()`.
+        lang (str, optional): Recognition language passed to the engine.
+
+    Returns:
+        OCREngine: The engine instance.
+
+    Raises:
+        ValueError: If the engine name is unknown.
+    """
+    name = name or default_ocr_engine_name()
+    with _engines_lock:
+        if (name, lang) not in _engines:
+            _engines[(name, lang)] = create_ocr_engine(name, lang)
+        return _engines[(name, lang)]
+
 
 class TextExtractor:
     """
-    A class to process PDF and image documents using Apple's Vision framework and pdf2image.
+    A class to process PDF and image documents using a configurable OCR engine and an
+    in-process PDF renderer.
 
     Provides utilities to:
       - Convert PDFs to images.
       - Extract text from images via OCR.
     """
 
-    def __init__(self, lang="eng"):
+    def __init__(self, lang=None, engine=None, cache=None):
         """
-        Initializes the DocumentProcessor.
+        Initializes the TextExtractor.
 
         Parameters:
-            lang (str): Language used for text recognition (currently unused, for future extension).
+            lang (str, optional): Language used for text recognition, passed to the engine.
+            engine (OCREngine, optional): Engine to use. Defaults to the configured one.
+            cache (OCRCache, optional): Persistent cache consulted before running the engine.
         """
         self.lang = lang
+        self.engine = engine or get_ocr_engine(lang=lang)
+        self.cache = cache
+
+    def render_page(self, pdf_path, page=0, dpi=200):
+        """
+        Renders a single page of a PDF as an RGB array, without writing it to disk.
+
+        Parameters:
+            pdf_path (str): The file path to the input PDF.
+            page (int): Zero-based index of the page to render.
+            dpi (int): Rendering resolution.
+
+        Returns:
+            np.ndarray: The rendered page (H x W x 3, uint8).
+        """
+        return get_page_cache().get(pdf_path, page=page, dpi=dpi, colorspace="RGB")
 
     def convert_pdf_to_image(self, pdf_path):
         """
@@ -38,65 +327,74 @@ class TextExtractor:
         Notes:
             - Only the first page of the PDF is saved as an image.
             - The output image is saved with the same base name as the PDF, but with a .jpg extension.
+            - The page is taken from the shared page cache, so it is rendered only once per case.
         """
         self.image_path = pdf_path.split('.')[0] + '.jpg'
-        images = convert_from_path(pdf_path)
-        for count, image in enumerate(images):
-            image.save(self.image_path, 'JPEG')
+        Image.fromarray(self.render_page(pdf_path)).save(self.image_path, 'JPEG')
         return self.image_path
 
-    def image_to_text(self, img_path):
+    def images_to_lines(self, images):
         """
-        Extracts text from an image file using Apple's Vision framework for OCR.
+        Extracts text lines from several images. Cached pages are served from the OCR
+        cache and the rest go to the engine in a single batch call.
 
         Parameters:
-            img_path (str): The path to the image file to be processed.
+            images (list of np.ndarray or str): Image arrays or paths.
 
         Returns:
-            list of str: A list of recognized text strings found in the image.
+            list of list of TextLine: Recognized lines for each image, in order.
         """
-        input_url = NSURL.fileURLWithPath_(img_path)
+        results = [None] * len(images)
+        keys = [None] * len(images)
+        if self.cache is not None:
+            for i, image in enumerate(images):
+                keys[i] = self.cache.make_key(image, self.engine)
+                results[i] = self.cache.get(keys[i])
 
-        with pipes() as (out, err):
-            input_image = Quartz.CIImage.imageWithContentsOfURL_(input_url)
+        missing = [i for i, lines in enumerate(results) if lines is None]
+        if missing:
+            recognized = self.engine.recognize_batch([images[i] for i in missing])
+            for i, lines in zip(missing, recognized):
+                results[i] = lines
+                if self.cache is not None:
+                    self.cache.set(keys[i], lines)
+        return results
 
-        vision_options = NSDictionary.dictionaryWithDictionary_({})
-        vision_handler = Vision.VNImageRequestHandler.alloc().initWithCIImage_options_(
-            input_image, vision_options
-        )
-        results = []
-        handler = self._make_request_handler(results)
-        vision_request = Vision.VNRecognizeTextRequest.alloc().initWithCompletionHandler_(handler)
-        error = vision_handler.performRequests_error_([vision_request], None)
+    def image_to_lines(self, image):
+        """
+        Extracts text lines with their boxes and confidences from an image.
 
-        return results
+        Parameters:
+            image (np.ndarray or str): Image array or path to the image file.
 
-    def _make_request_handler(self, results):
+        Returns:
+            list of TextLine: Recognized lines.
         """
-        Creates a handler function to process OCR results from a Vision text recognition request.
+        return self.images_to_lines([image])[0]
+
+    def image_to_text(self, image):
+        """
+        Extracts text from an image using the configured OCR engine.
 
         Parameters:
-            results (list): A list that will be populated with recognized text strings.
+            image (np.ndarray or str): Image array or path to the image file.
 
         Returns:
-            function: A handler function that takes `request` and `error` as parameters.
+            list of str: A list of recognized text strings found in the image.
+        """
+        return [line.text for line in self.image_to_lines(image)]
 
-        Raises:
-            ValueError: If `results` is not a list.
+    def images_to_text(self, images):
         """
-        if not isinstance(results, list):
-            raise ValueError("results must be a list")
+        Extracts text from several images with a single engine call.
 
-        def handler(request, error):
-            if error:
-                print(f"Error! {error}")
-            else:
-                observations = request.results()
-                for text_observation in observations:
-                    recognized_text = text_observation.topCandidates_(1)[0]
-                    results.append(recognized_text.string())
-        return handler
-    
+        Parameters:
+            images (list of np.ndarray or str): Image arrays or paths.
+
+        Returns:
+            list of list of str: Recognized text strings for each image, in order.
+        """
+        return [[line.text for line in lines] for lines in self.images_to_lines(images)]
 
     def delete_image(self):
         """
@@ -0,0 +1,103 @@
+import os
+import json
+import hashlib
+from dataclasses import asdict
+
+import numpy as np
+from PIL import Image
+from DiskCache import DiskCache
+from OCR import TextLine
+from Staging import Staging
+
+
+class OCRCache:
+    """
+    Persistent cache of OCR results, so re-uploaded or re-processed pages skip the
+    OCR engine.
+
+    Entries are keyed by a hash of the rendered page pixels together with the engine
+    name, version and settings, so changing any of them never serves stale text.
+
+    Attributes:
+        store (DiskCache): SQLite-backed store with size-bounded LRU eviction.
+    """
+
+    def __init__(self, path=None, max_bytes=256 * 1024 * 1024):
+        """
+        Initializes the OCR cache.
+
+        Args:
+            path (str, optional): Database path. Defaults to temp/ocr_cache/ocr.sqlite3.
+            max_bytes (int): Maximum total size of the cached results.
+        """
+        if path is None:
+            path = os.path.join(Staging("ocr_cache").staging_path, "ocr.sqlite3")
+        self.store = DiskCache(path, max_bytes=max_bytes)
+
+    @staticmethod
+    def make_key(image, engine):
+        """
+        Builds the cache key of a page for a given engine.
+
+        Args:
+            image (np.ndarray or str): Page pixels or path to the page image.
+            engine (OCREngine): Engine that produces the text.
+
+        Returns:
+            str: Hex digest identifying the page and the engine configuration.
+        """
+        if not isinstance(image, np.ndarray):
+            image = np.asarray(Image.open(image))
+
+        sha = hashlib.sha256()
+        sha.update(f"{image.shape}|{image.dtype}|".encode())
+        sha.update(np.ascontiguousarray(image).data)
+        sha.update(engine.name.encode())
+        sha.update(str(engine.version).encode())
+        sha.update(json.dumps(engine.settings, sort_keys=True, default=str).encode())
+        return sha.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached lines of a page, or None on a miss.
+
+        Args:
+            key (str): Key built with `make_key`.
+
+        Returns:
+            list of TextLine or None: The cached OCR result.
+        """
+        cached = self.store.get(key)
+        if cached is None:
+            return None
+        return [TextLine(line["text"], tuple(line["box"]), line["confidence"]) for line in cached]
+
+    def set(self, key, lines):
+        """
+        Stores the OCR result of a page.
+
+        Args:
+            key (str): Key built with `make_key`.
+            lines (list of TextLine): Recognized lines.
+        """
+        self.store.set(key, [asdict(line) for line in lines])
+
+
+_ocr_cache = None
+
+
+def get_ocr_cache():
+    """
+    Returns the process-wide OCR cache, or None if disabled with OCR_CACHE=0.
+
+    The maximum size is read from OCR_CACHE_MAX_MB (256 MB by default).
+
+    Returns:
+        OCRCache or None: The shared cache instance.
+    """
+    global _ocr_cache
+    if os.getenv("OCR_CACHE", "1") == "0":
+        return None
+    if _ocr_cache is None:
+        _ocr_cache = OCRCache(max_bytes=int(os.getenv("OCR_CACHE_MAX_MB", "256")) * 1024 * 1024)
+    return _ocr_cache
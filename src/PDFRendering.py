@@ -0,0 +1,115 @@
+import os
+import numpy as np
+
+
+class PDFRenderer:
+    """
+    Base class for PDF page renderers.
+
+    A renderer rasterizes only the pages it is asked for and returns them as uint8
+    NumPy arrays, either RGB (H x W x 3) or grayscale (H x W).
+    """
+
+    name = "base"
+
+    def render(self, pdf_path, pages=(0,), dpi=200, colorspace="RGB"):
+        """
+        Renders the requested pages of a PDF.
+
+        Args:
+            pdf_path (str): Path to the PDF file.
+            pages (iterable of int): Zero-based indices of the pages to render.
+            dpi (int): Rendering resolution.
+            colorspace (str): 'RGB' or 'GRAY'.
+
+        Returns:
+            list of np.ndarray: One array per requested page, in the same order.
+        """
+        raise NotImplementedError
+
+    def page_count(self, pdf_path):
+        """
+        Returns the number of pages of a PDF.
+
+        Args:
+            pdf_path (str): Path to the PDF file.
+
+        Returns:
+            int: Number of pages.
+        """
+        raise NotImplementedError
+
+
+class PyMuPDFRenderer(PDFRenderer):
+    """
+    In-process renderer based on PyMuPDF. No subprocess is spawned and pixmaps are
+    turned into arrays without going through an encoded image.
+    """
+
+    name = "pymupdf"
+
+    def __init__(self):
+        import fitz  # PyMuPDF
+        self._fitz = fitz
+
+    def render(self, pdf_path, pages=(0,), dpi=200, colorspace="RGB"):
+        fitz_colorspace = self._fitz.csGRAY if colorspace == "GRAY" else self._fitz.csRGB
+        images = []
+        with self._fitz.open(pdf_path) as doc:
+            for page in pages:
+                pix = doc[page].get_pixmap(dpi=dpi, colorspace=fitz_colorspace, alpha=False)
+                image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+                images.append(image[:, :, 0] if pix.n == 1 else image)
+        return images
+
+    def page_count(self, pdf_path):
+        with self._fitz.open(pdf_path) as doc:
+            return doc.page_count
+
+
+class Pdf2ImageRenderer(PDFRenderer):
+    """
+    Renderer based on pdf2image/poppler. Each call spawns a poppler process, so it is
+    kept only as a fallback for environments without PyMuPDF.
+    """
+
+    name = "pdf2image"
+
+    def render(self, pdf_path, pages=(0,), dpi=200, colorspace="RGB"):
+        from pdf2image import convert_from_path
+
+        mode = "L" if colorspace == "GRAY" else "RGB"
+        images = []
+        for page in pages:
+            rendered = convert_from_path(pdf_path, dpi=dpi, first_page=page + 1, last_page=page + 1)
+            images.append(np.asarray(rendered[0].convert(mode)))
+        return images
+
+    def page_count(self, pdf_path):
+        from pdf2image import pdfinfo_from_path
+        return pdfinfo_from_path(pdf_path)["Pages"]
+
+
+RENDERERS = {
+    PyMuPDFRenderer.name: PyMuPDFRenderer,
+    Pdf2ImageRenderer.name: Pdf2ImageRenderer,
+}
+
+
+def get_renderer(name=None):
+    """
+    Builds the renderer selected by name or by the PDF_RENDERER environment variable.
+
+    Args:
+        name (str, optional): 'pymupdf' (default) or 'pdf2image'.
+
+    Returns:
+        PDFRenderer: The renderer instance.
+
+    Raises:
+        ValueError: If the renderer name is unknown.
+    """
+    name = name or os.getenv("PDF_RENDERER", PyMuPDFRenderer.name)
+    if name not in RENDERERS:
+        raise ValueError(f"Unknown PDF renderer: {name}")
+    return RENDERERS[name]()
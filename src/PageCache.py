@@ -0,0 +1,184 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PDFRendering import get_renderer
+
+
+class PageRasterCache:
+    """
+    Content-addressed cache of rasterized PDF pages shared by every consumer of a case
+    (OCR, QR extraction and signature detection), so each page is rendered only once.
+
+    Entries are keyed by (PDF content hash, page, dpi, colorspace). The in-memory tier
+    evicts the least recently used pages once `max_entries` is reached; when `disk_dir`
+    is given, rendered pages are also stored there as .npy files and reloaded on a miss.
+
+    Attributes:
+        max_entries (int): Maximum number of pages kept in memory.
+        disk_dir (str or None): Directory for the optional on-disk tier.
+        renderer (PDFRenderer): Renderer used on a cache miss.
+    """
+
+    COLORSPACES = ("RGB", "BGR", "GRAY")
+
+    def __init__(self, max_entries=32, disk_dir=None, renderer=None):
+        """
+        Initializes the cache.
+
+        Args:
+            max_entries (int): Maximum number of pages kept in memory.
+            disk_dir (str, optional): Directory for the on-disk tier. Disabled if None.
+            renderer (PDFRenderer, optional): Renderer used on a cache miss. Defaults to
+                the one selected by `get_renderer()`.
+        """
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.renderer = renderer or get_renderer()
+        self._pages = OrderedDict()
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def hash_pdf(self, pdf_path):
+        """
+        Returns the SHA-256 of the PDF contents, memoized by path, size and mtime so
+        repeated lookups of the same file do not re-read it.
+
+        Args:
+            pdf_path (str): Path to the PDF file.
+
+        Returns:
+            str: Hex digest of the file contents.
+        """
+        stat = os.stat(pdf_path)
+        stat_key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            digest = self._hashes.get(stat_key)
+        if digest is not None:
+            return digest
+
+        sha = hashlib.sha256()
+        with open(pdf_path, "rb") as pdf_file:
+            for chunk in iter(lambda: pdf_file.read(1 << 20), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+
+        with self._lock:
+            self._hashes[stat_key] = digest
+        return digest
+
+    def get(self, pdf_path, page=0, dpi=200, colorspace="RGB"):
+        """
+        Returns the raster of a PDF page, rendering it only if it is not cached yet.
+
+        Args:
+            pdf_path (str): Path to the PDF file.
+            page (int): Zero-based page index.
+            dpi (int): Rendering resolution.
+            colorspace (str): 'RGB' or 'BGR' (H x W x 3, BGR being what OpenCV and YOLO
+                expect), or 'GRAY' (H x W).
+
+        Returns:
+            np.ndarray: Read-only uint8 array with the page pixels. Callers that need to
+            modify it must work on a copy.
+
+        Raises:
+            ValueError: If `colorspace` is not supported.
+        """
+        if colorspace not in self.COLORSPACES:
+            raise ValueError(f"Unsupported colorspace: {colorspace}")
+
+        key = (self.hash_pdf(pdf_path), page, dpi, colorspace)
+
+        with self._lock:
+            if key in self._pages:
+                self._pages.move_to_end(key)
+                return self._pages[key]
+
+        image = self._load_from_disk(key)
+        if image is None:
+            image = self._render(pdf_path, page, dpi, colorspace)
+            self._save_to_disk(key, image)
+
+        image.setflags(write=False)
+        with self._lock:
+            self._pages[key] = image
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return image
+
+    def clear(self):
+        """
+        Drops every page held in memory. The on-disk tier is left untouched.
+        """
+        with self._lock:
+            self._pages.clear()
+            self._hashes.clear()
+
+    def _render(self, pdf_path, page, dpi, colorspace):
+        """
+        Renders a single page of the PDF.
+
+        Returns:
+            np.ndarray: The rendered page as a uint8 array.
+        """
+        if colorspace == "BGR":
+            image = self.renderer.render(pdf_path, pages=[page], dpi=dpi, colorspace="RGB")[0]
+            return np.ascontiguousarray(image[:, :, ::-1])
+        image = self.renderer.render(pdf_path, pages=[page], dpi=dpi, colorspace=colorspace)[0]
+        return np.ascontiguousarray(image)
+
+    def _disk_path(self, key):
+        digest, page, dpi, colorspace = key
+        return os.path.join(self.disk_dir, f"{digest}_{page}_{dpi}_{colorspace}.npy")
+
+    def _load_from_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            return np.load(path)
+        except (OSError, ValueError):
+            return None
+
+    def _save_to_disk(self, key, image):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as tmp_file:
+            np.save(tmp_file, image)
+        os.replace(tmp_path, path)
+
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """
+    Returns the process-wide page cache, creating it on first use.
+
+    The on-disk tier is enabled by setting PAGE_CACHE_DIR, the in-memory size by
+    PAGE_CACHE_MAX_ENTRIES and the renderer by PDF_RENDERER.
+
+    Returns:
+        PageRasterCache: The shared cache instance.
+    """
+    global _page_cache
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageRasterCache(
+                max_entries=int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "32")),
+                disk_dir=os.getenv("PAGE_CACHE_DIR") or None,
+            )
+        return _page_cache
@@ -0,0 +1,250 @@
+import os
+import re
+import math
+import argparse
+from dataclasses import dataclass
+
+CADENA_ORIGINAL_FIELD = "Cadena original del complemento de certificación digital del SAT"
+
+# Lines that identify where each field appears in the OCR text
+FIELD_ANCHORS = {
+    "Nombre del solicitante": ["RECEPTOR", "CLIENTE", "NOMBRE", "PROPIETARIO", "TITULAR"],
+    "Nombre del nuevo dueño": ["ENDOS", "CEDO", "CEDE", "TRASPAS", "A FAVOR", "NOMBRE", "ADQUIRENTE", "COMPRADOR"],
+    "Marca": ["MARCA", "DESCRIPCI"],
+    "Modelo": ["MODELO", "DESCRIPCI"],
+    "Año": ["AÑO", "MODELO", "DESCRIPCI"],
+    "Versión": ["VERSI", "DESCRIPCI", "LINEA", "LÍNEA"],
+    "Número de motor": ["MOTOR"],
+    "NIV": ["NIV", "SERIE", "VIN"],
+    "Leyenda primera emisión": ["PRIMERA", "PRESENTE", "IMPRESI", "LEYENDA"],
+    CADENA_ORIGINAL_FIELD: ["CADENA ORIGINAL", "||"],
+    "Nombre Emisor": ["EMISOR", "S.A.", "RAZÓN SOCIAL", "RAZON SOCIAL"],
+    "Dirección de la agencia": ["DOMICILIO", "DIRECCI", "C.P.", "CALLE", "COL."],
+    "Folio Fiscal": ["FOLIO FISCAL", "FOLIOFISCAL", "UUID"],
+    "RFC Receptor": ["RFC", "RECEPTOR"],
+    "RFC Emisor": ["RFC", "EMISOR"],
+    "Fecha Certificación": ["CERTIFICACI", "TIMBRADO"],
+    "Fecha Expedición": ["EXPEDICI", "EMISI"],
+    "Tipo de fecha de vigencia": ["VIGENCIA", "VENCE", "VÁLIDA", "VALIDA"],
+    "Valor de fecha de vigencia": ["VIGENCIA", "VENCE", "VÁLIDA", "VALIDA"],
+    "Fecha de expedición": ["EXPEDICI"],
+    "Placa": ["PLACA"],
+    "Estado o entidad federativa": ["ENTIDAD", "ESTADO", "GOBIERNO", "SECRETAR", "CIUDAD DE M", "CDMX"],
+    "Uso del vehículo": ["USO", "SERVICIO"],
+    "Vigencia": ["VIGENCIA"],
+    "Vigente": ["VIGENCIA"],
+    "Clave de elector": ["CLAVE DE ELECTOR", "ELECTOR"],
+    "Fecha de nacimiento": ["NACIMIENTO"],
+}
+
+# Part of the document where a field is printed: kept in place of its anchor lines
+# when none of its anchors is found, so a misread anchor never loses the field
+FIELD_REGIONS = {
+    "Nombre del solicitante": "top",
+    "Nombre del nuevo dueño": "all",
+    "Marca": "middle",
+    "Modelo": "middle",
+    "Año": "middle",
+    "Versión": "middle",
+    "Número de motor": "middle",
+    "NIV": "middle",
+    "Leyenda primera emisión": "bottom",
+    CADENA_ORIGINAL_FIELD: "bottom",
+    "Nombre Emisor": "top",
+    "Dirección de la agencia": "top",
+    "Folio Fiscal": "top",
+    "RFC Receptor": "top",
+    "RFC Emisor": "top",
+    "Fecha Certificación": "bottom",
+    "Fecha Expedición": "top",
+    "Tipo de fecha de vigencia": "all",
+    "Valor de fecha de vigencia": "all",
+    "Fecha de expedición": "all",
+    "Placa": "top",
+    "Estado o entidad federativa": "top",
+    "Uso del vehículo": "all",
+    "Vigencia": "all",
+    "Vigente": "all",
+    "Clave de elector": "all",
+    "Fecha de nacimiento": "all",
+}
+
+# Lines that never carry a requested field
+BOILERPLATE_PATTERNS = [
+    re.compile(r"REPRESENTACI[OÓ]N IMPRESA DE UN CFDI"),
+    re.compile(r"^P[AÁ]GINA\s*\d+\s*(DE|/)\s*\d+$"),
+    re.compile(r"^SELLO DIGITAL DEL (EMISOR|SAT|CFDI)"),
+    re.compile(r"^NO\.? DE SERIE DEL CERTIFICADO"),
+    re.compile(r"^[A-Z0-9+/=]{40,}$"),  # Base64 stamps (sello digital)
+]
+
+
+def estimate_tokens(text):
+    """
+    Estimates the number of tokens of a text (about four characters per token for
+    Spanish text with Gemini's tokenizer), without a network call.
+
+    Args:
+        text (str): Prompt text.
+
+    Returns:
+        int: Estimated token count.
+    """
+    return math.ceil(len(text) / 4)
+
+
+@dataclass
+class CompactionResult:
+    """
+    Outcome of compacting the OCR text of a document.
+
+    Attributes:
+        text (str): Text to send to the LLM.
+        tokens_before (int): Estimated tokens of the original text.
+        tokens_after (int): Estimated tokens of the compacted text.
+        anchored (bool): True if every field was found by its anchors; False if some
+            field kept its whole region of the document instead.
+    """
+    text: str
+    tokens_before: int
+    tokens_after: int
+    anchored: bool
+
+    @property
+    def reduction(self):
+        return 1 - self.tokens_after / self.tokens_before if self.tokens_before else 0.0
+
+
+class PromptCompactor:
+    """
+    Shrinks the OCR text sent to the extraction prompts.
+
+    Duplicate lines, lines without letters or digits and boilerplate (CFDI legends,
+    page numbers, digital stamps) are dropped. Then only the first lines of the
+    document and the lines around the anchors of the requested fields are kept. A field
+    none of whose anchors is found keeps its whole region of the document (top, middle
+    or bottom third, or all of it; see FIELD_REGIONS), so it is never lost because its
+    anchor was misread, and the other fields are still compacted.
+
+    Attributes:
+        window (int): Lines kept after each anchor line (and one before it).
+        header_lines (int): Lines always kept from the top of the document.
+    """
+
+    def __init__(self, window=2, header_lines=5):
+        self.window = window
+        self.header_lines = header_lines
+
+    def _clean(self, lines, campos):
+        keep_cadena = CADENA_ORIGINAL_FIELD in campos
+        seen = set()
+        cleaned = []
+        for line in lines:
+            line = " ".join(line.split())
+            key = line.upper()
+            if not re.search(r"[A-Z0-9]", key) or key in seen:
+                continue
+            if any(pattern.search(key) for pattern in BOILERPLATE_PATTERNS):
+                continue
+            if not keep_cadena and key.startswith("||"):
+                continue
+            seen.add(key)
+            cleaned.append(line)
+        return cleaned
+
+    @staticmethod
+    def _region(region, count):
+        third = math.ceil(count / 3)
+        if region == "top":
+            return range(0, third)
+        if region == "middle":
+            return range(count // 3, count - count // 3)
+        if region == "bottom":
+            return range(count - third, count)
+        return range(count)
+
+    def compact(self, texto, campos):
+        """
+        Compacts the OCR text for the requested fields.
+
+        Args:
+            texto (str): OCR text, one line per row.
+            campos (list of str): Fields the LLM is asked for.
+
+        Returns:
+            CompactionResult: The compacted text and the token estimates.
+        """
+        lines = self._clean(texto.splitlines(), campos)
+        upper = [line.upper() for line in lines]
+
+        keep = set(range(min(self.header_lines, len(lines))))
+        anchored = True
+        for campo in campos:
+            anchors = FIELD_ANCHORS.get(campo, [])
+            hits = [i for i, line in enumerate(upper) if any(anchor in line for anchor in anchors)]
+            if not hits:
+                anchored = False
+                keep.update(self._region(FIELD_REGIONS.get(campo, "all"), len(lines)))
+            for i in hits:
+                keep.update(range(max(0, i - 1), min(len(lines), i + self.window + 1)))
+
+        lines = [line for i, line in enumerate(lines) if i in keep]
+        compacted = "\n".join(lines)
+        return CompactionResult(compacted, estimate_tokens(texto), estimate_tokens(compacted), anchored)
+
+
+def compaction_enabled():
+    return os.getenv("PROMPT_COMPACTION", "1") != "0"
+
+
+def main():
+    """
+    Regression harness: reports the token reduction on labeled cases and, with
+    --compare, the fields whose extracted value changes when the prompt is compacted.
+    """
+    from CaseProcessing import classify_documents
+    from StatisticalClassifier import iter_labeled_pdfs
+    import DataExtraction
+
+    extractors = {
+        "FACTURA": DataExtraction.FacturaDataExtractor,
+        "FACTURA REVERSO": DataExtraction.FacturaReversoDataExtractor,
+        "INE": DataExtraction.INEDataExtractor,
+        "TARJETA CIRCULACION": DataExtraction.TarjetCirculacionDataExtractor,
+    }
+
+    parser = argparse.ArgumentParser(description="Mide la reducción de tokens de los prompts de extracción.")
+    parser.add_argument("paths", nargs="+", help="Carpetas o archivos .zip de casos")
+    parser.add_argument("--compare", action="store_true", help="Extrae con y sin compactación y compara los campos")
+    args = parser.parse_args()
+
+    labeled = [(pdf_path, label) for pdf_path, label in iter_labeled_pdfs(args.paths) if label in extractors]
+    texts = classify_documents([pdf_path for pdf_path, _ in labeled], staged=False)
+
+    total_before = total_after = 0
+    differences = 0
+    for pdf_path, label in labeled:
+        texto = "\n".join(texts[pdf_path]["text"])
+        result = PromptCompactor().compact(texto, extractors[label].campos_requeridos)
+        total_before += result.tokens_before
+        total_after += result.tokens_after
+        print(f"{os.path.basename(pdf_path)}: {result.tokens_before} -> {result.tokens_after} tokens ({result.reduction:.0%})")
+
+        if args.compare:
+            datos = {}
+            for enabled in ("0", "1"):
+                os.environ["PROMPT_COMPACTION"] = enabled
+                datos[enabled] = extractors[label](texto, os.getenv("GEMINI_API_KEY")).extraer_datos()
+            for campo, valor in datos["0"].items():
+                if datos["1"].get(campo) != valor:
+                    differences += 1
+                    print(f"  {campo}: {valor!r} -> {datos['1'].get(campo)!r}")
+
+    if total_before:
+        print(f"Total: {total_before} -> {total_after} tokens ({1 - total_after / total_before:.0%} menos)")
+    if args.compare:
+        print(f"Campos distintos con compactación: {differences}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,4 @@
-from pdf2image import convert_from_path
 from PIL import Image
-import cv2
 from pyzbar.pyzbar import decode, ZBarSymbol
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -10,6 +8,7 @@ from selenium.webdriver.chrome.options import Options
 import os
 import time
 from Staging import Staging
+from PageCache import get_page_cache
 
 class CFDIValidator:
     """
@@ -19,7 +18,7 @@ class CFDIValidator:
 
     Attributes:
         pdf_path (str): Path to the invoice PDF file.
-        image_path (str): Path to the image generated from the PDF.
+        image (np.ndarray): Grayscale raster of the first page, kept in memory.
         browser (webdriver.Chrome): Selenium-controlled Chrome browser instance.
     """
 
@@ -31,19 +30,29 @@ class CFDIValidator:
             pdf_path (str): Path to the PDF file containing the CFDI.
         """
         self.pdf_path = pdf_path
-        self.image_path = self.convert_pdf_to_image()
+        self.image = self.load_image()
         self.browser = None
 
+    def load_image(self):
+        """
+        Loads the first page of the PDF as a grayscale array from the shared page cache.
+
+        Returns:
+            np.ndarray: Grayscale image of the first page.
+        """
+        return get_page_cache().get(self.pdf_path, page=0, colorspace="GRAY")
+
     def convert_pdf_to_image(self):
         """
-        Converts the first page of the PDF to a PNG image.
+        Converts the first page of the PDF to a PNG image. Only needed when a file is
+        explicitly required, since QR extraction works on the in-memory image.
 
         Returns:
             str: Path to the generated image file.
         """
         image_path = self.pdf_path.split('.')[0] + '.png'
-        images = convert_from_path(self.pdf_path)
-        images[0].save(image_path, 'PNG')
+        page = get_page_cache().get(self.pdf_path, page=0, colorspace="RGB")
+        Image.fromarray(page).save(image_path, 'PNG')
         return image_path
 
     def extract_url_from_qr(self):
@@ -54,9 +63,7 @@ class CFDIValidator:
         Returns:
             list: List of SAT verification URLs extracted from the QR code.
         """
-        image = cv2.imread(self.image_path)
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        qr_codes = decode(gray, symbols=[ZBarSymbol.QRCODE])
+        qr_codes = decode(self.image, symbols=[ZBarSymbol.QRCODE])
 
         sat_base_url = "https://verificacfdi.facturaelectronica.sat.gob.mx"
         urls = []
@@ -66,7 +73,6 @@ class CFDIValidator:
             if data.startswith(sat_base_url):
                 urls.append(data)
 
-        os.remove(self.image_path)  # Delete image after processing
         return urls
 
 
@@ -0,0 +1,314 @@
+import os
+import time
+import heapq
+import sqlite3
+import threading
+import itertools
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from PromptCompaction import estimate_tokens
+
+# Lower values are served first: reviewer-facing calls go ahead of background work
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# Output tokens reserved per request until the response reports the actual usage
+OUTPUT_TOKENS_ESTIMATE = 512
+
+_priority = contextvars.ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+_case_usage = contextvars.ContextVar("llm_case_usage", default=None)
+
+
+@dataclass
+class TokenUsage:
+    """
+    Tokens consumed by the Gemini calls of a case.
+
+    Attributes:
+        requests (int): Requests sent.
+        prompt_tokens (int): Input tokens, cached ones included.
+        cached_tokens (int): Input tokens Gemini served from its implicit cache.
+        output_tokens (int): Generated tokens.
+        total_tokens (int): Tokens billed for the requests.
+    """
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, usage_metadata):
+        """
+        Adds the usage reported by a response.
+
+        Args:
+            usage_metadata (types.GenerateContentResponseUsageMetadata or None): The
+                `usage_metadata` of a response.
+        """
+        with self._lock:
+            self.requests += 1
+            if usage_metadata is None:
+                return
+            self.prompt_tokens += usage_metadata.prompt_token_count or 0
+            self.cached_tokens += usage_metadata.cached_content_token_count or 0
+            self.output_tokens += usage_metadata.candidates_token_count or 0
+            self.total_tokens += usage_metadata.total_token_count or 0
+
+
+def set_case_usage(usage):
+    """
+    Makes `usage` collect the tokens of the Gemini calls made from the current context
+    (and from the worker threads started from it with a copied context).
+
+    Args:
+        usage (TokenUsage or None): Accumulator of the current case.
+    """
+    _case_usage.set(usage)
+
+
+def current_case_usage():
+    return _case_usage.get()
+
+
+@contextmanager
+def llm_priority(priority):
+    """
+    Sets the priority of the Gemini calls made inside the block.
+
+    Args:
+        priority (int): PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def estimate_request_tokens(contents, config=None):
+    """
+    Estimates the tokens a request will consume before sending it.
+
+    Args:
+        contents (str or list): Prompt contents.
+        config (types.GenerateContentConfig, optional): Generation settings; an inline
+            system instruction is counted.
+
+    Returns:
+        int: Estimated input tokens plus OUTPUT_TOKENS_ESTIMATE.
+    """
+    tokens = estimate_tokens(contents if isinstance(contents, str) else str(contents))
+    system_instruction = getattr(config, "system_instruction", None)
+    if isinstance(system_instruction, str):
+        tokens += estimate_tokens(system_instruction)
+    return tokens + OUTPUT_TOKENS_ESTIMATE
+
+
+def _take(levels, elapsed, capacities, needs):
+    """
+    Refills the buckets for `elapsed` seconds and takes `needs` if every bucket has them.
+
+    Args:
+        levels (dict): Current level of each bucket; updated in place.
+        elapsed (float): Seconds since the last update.
+        capacities (dict): Per-minute capacity of each bucket.
+        needs (dict): Amount to take from each bucket.
+
+    Returns:
+        float: 0.0 if taken, else seconds until the emptiest bucket has enough.
+    """
+    for name, capacity in capacities.items():
+        levels[name] = min(capacity, levels[name] + elapsed * capacity / 60)
+    waits = [
+        (needs[name] - levels[name]) * 60 / capacity
+        for name, capacity in capacities.items()
+        if levels[name] < needs[name]
+    ]
+    if waits:
+        return max(waits)
+    for name in capacities:
+        levels[name] -= needs[name]
+    return 0.0
+
+
+class _LocalBuckets:
+    """
+    Buckets shared by the threads of this process.
+    """
+
+    def __init__(self, capacities):
+        self.capacities = capacities
+        self.levels = dict(capacities)
+        self.updated = time.monotonic()
+
+    def take(self, needs):
+        now = time.monotonic()
+        wait = _take(self.levels, now - self.updated, self.capacities, needs)
+        self.updated = now
+        return wait
+
+    def adjust(self, name, delta):
+        if name in self.levels:
+            self.levels[name] = min(self.capacities[name], self.levels[name] + delta)
+
+
+class _SQLiteBuckets:
+    """
+    Buckets stored in a SQLite database, shared by every process that opens it.
+    """
+
+    def __init__(self, path, capacities):
+        self.path = path
+        self.capacities = capacities
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)")
+            for name, capacity in capacities.items():
+                conn.execute("INSERT OR IGNORE INTO buckets VALUES (?, ?, ?)", (name, capacity, time.time()))
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def take(self, needs):
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT name, level, updated FROM buckets").fetchall()
+            levels = {name: level for name, level, _ in rows if name in self.capacities}
+            now = time.time()
+            # Every bucket is updated in the same transaction, so they share the timestamp
+            elapsed = max(0.0, now - min(updated for _, _, updated in rows))
+            wait = _take(levels, elapsed, self.capacities, needs)
+            conn.executemany("UPDATE buckets SET level = ?, updated = ? WHERE name = ?", [(level, now, name) for name, level in levels.items()])
+        return wait
+
+    def adjust(self, name, delta):
+        if name not in self.capacities:
+            return
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE buckets SET level = MIN(?, level + ?) WHERE name = ?",
+                (self.capacities[name], delta, name),
+            )
+
+
+class RateLimiter:
+    """
+    Paces the Gemini requests with requests-per-minute and tokens-per-minute token
+    buckets, so concurrent sessions queue instead of failing with 429.
+
+    Waiting requests are served by priority and, within a priority, in arrival order.
+    Tokens are reserved from an estimate before sending and corrected with the usage
+    the response reports. With `path`, the buckets live in a SQLite database shared by
+    every process of the host.
+
+    Attributes:
+        rpm (int): Requests per minute; 0 disables the bucket.
+        tpm (int): Tokens per minute; 0 disables the bucket.
+    """
+
+    def __init__(self, rpm=60, tpm=1000000, path=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        capacities = {name: capacity for name, capacity in (("requests", rpm), ("tokens", tpm)) if capacity}
+        self._buckets = _SQLiteBuckets(path, capacities) if path else _LocalBuckets(capacities)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def acquire(self, tokens, priority=None, timeout=None):
+        """
+        Blocks until a request of `tokens` estimated tokens may be sent.
+
+        Args:
+            tokens (int): Estimated tokens of the request.
+            priority (int, optional): Defaults to the priority of the current context.
+            timeout (float, optional): Seconds to wait for a turn. None waits indefinitely.
+
+        Returns:
+            bool: True if the request may be sent, False if `timeout` ran out first.
+        """
+        priority = current_priority() if priority is None else priority
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # A request larger than the whole bucket would never fit; it waits for a full one
+        needs = {"requests": 1, "tokens": min(tokens, self.tpm) if self.tpm else tokens}
+        ticket = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0] == ticket:
+                        wait = self._buckets.take(needs)
+                        if wait == 0.0:
+                            return True
+                        # Other processes may take tokens meanwhile; look again soon
+                        wait = min(wait, 1.0)
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._condition.wait(wait)
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+
+    def settle(self, estimated, actual):
+        """
+        Returns to the token bucket the difference between the estimate and the usage
+        reported by the response (or takes the excess).
+
+        Args:
+            estimated (int): Tokens reserved by `acquire`.
+            actual (int or None): Tokens reported by the response.
+        """
+        if actual is None:
+            return
+        with self._condition:
+            self._buckets.adjust("tokens", estimated - actual)
+            self._condition.notify_all()
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Returns the process-wide rate limiter, or None if disabled with RATE_LIMIT=0.
+
+    The limits are read from GEMINI_RPM (60) and GEMINI_TPM (1,000,000); 0 disables a
+    limit. With RATE_LIMIT_DB the buckets are kept in that SQLite file and shared by
+    every process using it.
+
+    Returns:
+        RateLimiter or None: The shared rate limiter.
+    """
+    global _rate_limiter
+    if os.getenv("RATE_LIMIT", "1") == "0":
+        return None
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(
+                rpm=int(os.getenv("GEMINI_RPM", "60")),
+                tpm=int(os.getenv("GEMINI_TPM", "1000000")),
+                path=os.getenv("RATE_LIMIT_DB") or None,
+            )
+        return _rate_limiter
@@ -0,0 +1,300 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# HTTP status codes worth retrying: rate limiting and transient upstream failures
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a call does not finish within its timeout or overall deadline.
+    """
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised without calling the upstream while the circuit breaker is open.
+    """
+
+
+class QueueTimeout(RuntimeError):
+    """
+    Raised when a call gets no turn from the rate limiter within its deadline. The
+    upstream was not called, so it is neither retried nor counted by the breaker.
+    """
+
+
+def is_retryable(error):
+    """
+    Classifies an error raised by a call.
+
+    Timeouts, connection errors and HTTP 408/429/5xx responses are retryable; other
+    client errors (bad request, authentication, not found) are not.
+
+    Args:
+        error (Exception): The error raised.
+
+    Returns:
+        bool: True if the call may succeed when repeated.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    # httpx transport errors (timeouts, refused connections) carry no status code
+    return type(error).__module__.startswith("httpx")
+
+
+class LatencyTracker:
+    """
+    Keeps the latencies of the last successful calls to estimate a percentile.
+
+    Attributes:
+        window (int): Number of latencies kept.
+        min_samples (int): Samples needed before a percentile is reported.
+    """
+
+    def __init__(self, window=200, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q=0.95):
+        """
+        Returns the q-quantile of the recorded latencies, or None with too few samples.
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls fail
+    immediately with CircuitOpenError. After `reset_timeout` seconds one trial call is
+    let through (half-open); its success closes the circuit and its failure reopens it.
+
+    Attributes:
+        failure_threshold (int): Consecutive failures that open the circuit.
+        reset_timeout (float): Seconds the circuit stays open before a trial call.
+        state (str): 'closed', 'open' or 'half-open'.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        """
+        Returns True while calls are rejected, without taking the half-open trial.
+        """
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def allow(self):
+        """
+        Returns True if a call may be made now.
+        """
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = "half-open"
+                return True
+            # Only one trial call at a time while half-open
+            return self.state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """
+    Runs blocking calls (e.g. Gemini requests) with a per-attempt timeout, an overall
+    deadline, retries with exponential backoff and full jitter on retryable errors, an
+    optional hedged request and a circuit breaker.
+
+    When hedging is enabled and an attempt is still running after the p95 latency of
+    recent calls, a second identical request is sent and the first one to succeed wins.
+    The result of the losing request, or of one abandoned after its timeout, is handed
+    to `on_discard` when it arrives, e.g. to close a stream.
+
+    With `acquire`, each attempt first waits for a turn (e.g. from the rate limiter)
+    within the overall deadline and before its timeout starts, so queueing is not an
+    upstream failure. A hedged copy is only sent if a turn is free at once.
+
+    Attributes:
+        timeout (float): Seconds allowed for each attempt.
+        deadline (float): Seconds allowed for the call, retries included.
+        max_retries (int): Retries after the first attempt.
+        base_delay (float): Backoff before the first retry, doubled on each retry.
+        max_delay (float): Upper bound of the backoff.
+        hedge (bool): Send a second request after the p95 latency.
+        breaker (CircuitBreaker): Circuit breaker shared by every call.
+        latency (LatencyTracker): Latencies of successful attempts.
+    """
+
+    def __init__(self, timeout=30.0, deadline=90.0, max_retries=3, base_delay=0.5, max_delay=8.0,
+                 hedge=False, breaker=None, max_workers=16):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+
+    def call(self, fn, *args, on_discard=None, acquire=None, **kwargs):
+        """
+        Calls `fn(*args, **kwargs)` with the resilience policy.
+
+        Args:
+            fn (callable): The call to make; each attempt calls it again.
+            on_discard (callable, optional): Receives the results that are not returned
+                (losing hedged requests, attempts that finish after their timeout).
+            acquire (callable, optional): Called with the seconds left before each
+                request is sent; returns False if no turn was granted in that time.
+
+        Returns:
+            object: The result of the first successful attempt.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open.
+            QueueTimeout: If `acquire` granted no turn before the deadline.
+            DeadlineExceeded: If the call did not succeed before the deadline.
+            Exception: The last error, if it is not retryable or retries are exhausted.
+        """
+        deadline_at = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            if self.breaker.is_open():
+                raise CircuitOpenError("Servicio de Gemini degradado; se omite la llamada temporalmente")
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"Plazo de {self.deadline} s agotado")
+            if acquire is not None and not acquire(remaining):
+                raise QueueTimeout(f"Sin turno en el limitador en {self.deadline} s")
+            if not self.breaker.allow():
+                raise CircuitOpenError("Servicio de Gemini degradado; se omite la llamada temporalmente")
+
+            remaining = max(0.0, deadline_at - time.monotonic())
+            try:
+                result = self._attempt(fn, args, kwargs, min(self.timeout, remaining), on_discard, acquire)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()  # The upstream answered; the request was wrong
+                if not retryable or attempt == self.max_retries:
+                    raise
+                backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                time.sleep(max(0.0, min(backoff, deadline_at - time.monotonic())))
+            else:
+                self.breaker.record_success()
+                return result
+
+    def _attempt(self, fn, args, kwargs, timeout, on_discard=None, acquire=None):
+        """
+        Runs one attempt, hedged if enabled, and waits at most `timeout` seconds.
+        """
+        started = time.monotonic()
+
+        def timed():
+            # Each request is timed from its own start, so a hedge's delay is not counted
+            request_started = time.monotonic()
+            result = fn(*args, **kwargs)
+            self.latency.record(time.monotonic() - request_started)
+            return result
+
+        def discard(future):
+            if on_discard is not None and not future.cancelled() and future.exception() is None:
+                on_discard(future.result())
+
+        futures = [self._executor.submit(timed)]
+        hedge_after = self.latency.percentile(0.95) if self.hedge else None
+        if hedge_after is not None and hedge_after < timeout:
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done and (acquire is None or acquire(0)):
+                futures.append(self._executor.submit(timed))
+
+        error = None
+        pending = set(futures)
+        while pending:
+            remaining = timeout - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # Running requests cannot be interrupted; their results are discarded
+                    for other in pending:
+                        if not other.cancel():
+                            other.add_done_callback(discard)
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not pending:
+            raise error
+        for future in pending:
+            if not future.cancel():
+                future.add_done_callback(discard)
+        raise DeadlineExceeded(f"Sin respuesta en {timeout:.1f} s")
+
+
+_caller = None
+_caller_lock = threading.Lock()
+
+
+def get_caller():
+    """
+    Returns the process-wide caller configured from the environment: GEMINI_TIMEOUT
+    (seconds per attempt, 30), GEMINI_DEADLINE (seconds per call, 90),
+    GEMINI_MAX_RETRIES (3), GEMINI_HEDGE (1 to enable hedging, off by default),
+    GEMINI_BREAKER_FAILURES (5) and GEMINI_BREAKER_RESET (seconds, 30).
+
+    Returns:
+        ResilientCaller: The shared caller.
+    """
+    global _caller
+    with _caller_lock:
+        if _caller is None:
+            _caller = ResilientCaller(
+                timeout=float(os.getenv("GEMINI_TIMEOUT", "30")),
+                deadline=float(os.getenv("GEMINI_DEADLINE", "90")),
+                max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+                hedge=os.getenv("GEMINI_HEDGE", "0") == "1",
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+                    reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET", "30")),
+                ),
+            )
+        return _caller
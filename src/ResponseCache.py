@@ -0,0 +1,106 @@
+import os
+import json
+import hashlib
+
+from DiskCache import DiskCache
+from Staging import Staging
+
+
+class ResponseCache:
+    """
+    Persistent cache of Gemini responses, so re-uploaded cases, Streamlit reruns and
+    retries do not send the same prompt twice.
+
+    Entries are keyed by a hash of the model, the system message and the input text,
+    and store the text of the response. They expire after `ttl` seconds and the least
+    recently used ones are evicted once the cache exceeds `max_bytes`.
+
+    Attributes:
+        store (DiskCache): SQLite-backed store.
+    """
+
+    def __init__(self, path=None, max_bytes=64 * 1024 * 1024, ttl=7 * 24 * 3600):
+        """
+        Initializes the response cache.
+
+        Args:
+            path (str, optional): Database path. Defaults to temp/llm_cache/responses.sqlite3.
+            max_bytes (int): Maximum total size of the cached responses.
+            ttl (float, optional): Seconds after which a response expires.
+        """
+        if path is None:
+            path = os.path.join(Staging("llm_cache").staging_path, "responses.sqlite3")
+        self.store = DiskCache(path, max_bytes=max_bytes, ttl=ttl)
+
+    @staticmethod
+    def make_key(model, system_message, input_message):
+        """
+        Builds the cache key of a request.
+
+        Args:
+            model (str): Model name.
+            system_message (str): Instructions sent with the request.
+            input_message (str or object): Input text, or a JSON-serializable input.
+
+        Returns:
+            str: Hex digest identifying the request.
+        """
+        if not isinstance(input_message, str):
+            input_message = json.dumps(input_message, sort_keys=True, ensure_ascii=False, default=str)
+        payload = json.dumps([model, system_message, input_message], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached response text, or None on a miss.
+
+        Args:
+            key (str): Key built with `make_key`.
+
+        Returns:
+            str or None: The response text.
+        """
+        return self.store.get(key)
+
+    def set(self, key, text):
+        """
+        Stores the text of a response.
+
+        Args:
+            key (str): Key built with `make_key`.
+            text (str): Response text.
+        """
+        self.store.set(key, text)
+
+    def stats(self):
+        """
+        Returns the hit and miss counters of this process.
+
+        Returns:
+            dict: Keys 'hits', 'misses' and 'hit_rate'.
+        """
+        return self.store.stats()
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    """
+    Returns the process-wide response cache, or None if disabled with LLM_CACHE=0.
+
+    The maximum size and the expiry are read from LLM_CACHE_MAX_MB (64 MB by default)
+    and LLM_CACHE_TTL (seconds, 7 days by default).
+
+    Returns:
+        ResponseCache or None: The shared cache instance.
+    """
+    global _response_cache
+    if os.getenv("LLM_CACHE", "1") == "0":
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024,
+            ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+        )
+    return _response_cache
@@ -1,4 +1,5 @@
-from google import genai
+from GeminiClient import GEMINI_MODEL, generate_with_system, response_text
+from ResponseCache import get_response_cache
 import os
 from dotenv import load_dotenv
 import json
@@ -36,10 +37,8 @@ def call_gemini(api_key: str, system_message: str, data_results_message: dict, d
     Returns:
         genai.types.GenerateContentResponse: The response generated by the Gemini model.
     """
-    prompt = f"{system_message}\n\nDiccionarios con los resultados:\n{data_results_message}\n\n{data_results_bool}\n\n{sign_results_message}\n\n{sign_results_bool}\n\n"
-    client = genai.Client(api_key=api_key)
-    response = client.models.generate_content(model="gemini-2.0-flash", contents=prompt)
-    return response
+    prompt = f"Diccionarios con los resultados:\n{data_results_message}\n\n{data_results_bool}\n\n{sign_results_message}\n\n{sign_results_bool}\n\n"
+    return generate_with_system(api_key, system_message, prompt)
 
 class RulingMaker:
     """
@@ -159,18 +158,24 @@ class RulingMaker:
         Returns:
             str: The processed and extracted text generated by the model.
         """
-        json_response = response.model_dump_json()
-        json_data = json.loads(json_response)
-        json_processed = json_data['candidates'][0]['content']['parts'][0]['text']
-        return json_processed
+        return response_text(response)
     
     def obtener_dictamen(self):
         """
         Executes the full pipeline to generate a ruling using the Gemini API.
 
+        Identical validation results are served from the response cache.
+
         Returns:
             str: The final decision generated based on validation results.
         """
+        cache = get_response_cache()
+        inputs = [self.data_results_message, self.data_results_bool, self.sign_results_message, self.sign_results_bool]
+        key = cache.make_key(GEMINI_MODEL, self.system_message, inputs) if cache else None
+        self.response = cache.get(key) if cache else None
+        if self.response is not None:
+            return self.response
+
         response = call_gemini(
             self.api_key, 
             self.system_message, 
@@ -180,6 +185,8 @@ class RulingMaker:
             self.sign_results_bool
         )
         self.response = self.parse_json(response)
+        if cache:
+            cache.set(key, self.response)
         return self.response
 
 
@@ -1,12 +1,12 @@
 import os
 import cv2
-import fitz  # PyMuPDF
 import numpy as np
 from skimage.metrics import structural_similarity as ssim
 from matplotlib import pyplot as plt
-from typing import Dict, Tuple
+from typing import Dict, Tuple, Union
 from ultralytics import YOLO
 from Staging import Staging
+from PageCache import get_page_cache
 
 class SignatureComparator:
     """
@@ -60,9 +60,27 @@ class SignatureComparator:
         self.staging_signatures = Staging("signatures")
         self.staging_signatues_path = self.staging_signatures.run()
 
+    def make_image(self, input_path: str) -> np.ndarray:
+        """
+        Loads the first page of a PDF as a BGR array from the shared page cache.
+
+        Parameters
+        ----------
+        input_path : str
+            Path to the PDF file.
+
+        Returns
+        -------
+        np.ndarray
+            First page in BGR, ready for OpenCV and YOLO.
+        """
+
+        return get_page_cache().get(input_path, page=0, dpi=200, colorspace="BGR")
+
     def make_jpg(self, input_path: str) -> str:
         """
-        Converts the first page of a PDF to a JPG image.
+        Converts the first page of a PDF to a JPG image. Only needed when a file is
+        explicitly required; the detection pipeline works on `make_image` arrays.
 
         Parameters
         ----------
@@ -78,9 +96,7 @@ class SignatureComparator:
         nombre_base = input_path.split('/')[-1].split('.')[0] + '.jpg'
         ruta_jpg = os.path.join(self.staging_signatues_path, nombre_base)
 
-        doc = fitz.open(input_path)
-        pix = doc[0].get_pixmap(dpi=200)
-        pix.save(ruta_jpg)
+        cv2.imwrite(ruta_jpg, self.make_image(input_path))
 
         return ruta_jpg
 
@@ -97,6 +113,30 @@ class SignatureComparator:
         if os.path.isfile(ruta_jpg):
             os.remove(ruta_jpg)
 
+    #------------------- AUXILIAR: carga de imagen ------------------- #
+    @staticmethod
+    def _load_image(img: Union[np.ndarray, str]) -> Tuple[np.ndarray, str]:
+        """
+        Returns the image as an array, reading it from disk only if a path is given.
+
+        Parameters
+        ----------
+        img : np.ndarray or str
+            BGR image or path to an image file.
+
+        Returns
+        -------
+        Tuple[np.ndarray, str]
+            - The BGR image, or False if the file does not exist.
+            - Error message when the image could not be loaded, None otherwise.
+        """
+
+        if isinstance(img, np.ndarray):
+            return img, None
+        if not os.path.isfile(img):
+            return False, f"El archivo no existe: {img}"
+        return cv2.imread(img), None
+
     #------------------- AUXILIAR: gris + uint8 ------------------- #
     @staticmethod
     def _to_gray_u8(img: np.ndarray) -> np.ndarray:
@@ -129,20 +169,21 @@ class SignatureComparator:
         return img
 
     # -------------------- 1. Firma en la INE ---------------------- #
-    def _extract_ine_signature(self, img_path: str) -> Tuple[np.ndarray, str]:
+    def _extract_ine_signature(self, img_path: Union[np.ndarray, str]) -> Tuple[np.ndarray, str]:
         """
         Detects and crops the signature from an INE image.
 
         Parameters
         ----------
-        img_path : str
-            Path to the INE image.
+        img_path : np.ndarray or str
+            INE image (BGR array) or path to it.
 
         Returns
         -------
         Tuple[np.ndarray, str]
             - Cropped signature region as a NumPy array.
-            - Path where the signature image was saved (only if save_signature_ine is True).
+            - Path where the signature image was saved (only if save_signature_ine is True,
+              None otherwise).
 
         Raises
         ------
@@ -151,10 +192,9 @@ class SignatureComparator:
         """
 
 
-        if not os.path.isfile(img_path):
-            return False, f"El archivo no existe: {img_path}"
-
-        img  = cv2.imread(img_path)
+        img, error = self._load_image(img_path)
+        if img is False:
+            return False, error
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
         # 1) Aislar credencial
@@ -179,11 +219,11 @@ class SignatureComparator:
         roi = ine_crop[y1:y2, x1:x2]
 
         # Visualización opcional
+        save_path = None
         if self.save_signature_ine:
             roi_rgb = cv2.cvtColor(roi, cv2.COLOR_BGR2RGB)
 
             # Save the image in the staging folder
-            base_name = os.path.splitext(os.path.basename(img_path))[0]
             save_path = os.path.join(self.staging_signatues_path, f"firma_ine.jpg")
             cv2.imwrite(save_path, cv2.cvtColor(roi_rgb, cv2.COLOR_RGB2BGR))
 
@@ -191,20 +231,21 @@ class SignatureComparator:
 
 
     # --------------- 2. Firma en documento genérico --------------- #
-    def _extract_factura_signature(self, img_path: str) -> Tuple[np.ndarray, str]:
+    def _extract_factura_signature(self, img_path: Union[np.ndarray, str]) -> Tuple[np.ndarray, str]:
         """
         Extracts the signature from a document (invoice) using YOLO.
 
         Parameters
         ----------
-        img_path : str
-            Path to the document image.
+        img_path : np.ndarray or str
+            Document image (BGR array) or path to it.
 
         Returns
         -------
         Tuple[np.ndarray, str]
             - Cropped signature region as a NumPy array.
-            - Path where the signature image was saved (only if save_signature_factura is True).
+            - Path where the signature image was saved (only if save_signature_factura is True,
+              None otherwise).
 
         Raises
         ------
@@ -213,13 +254,12 @@ class SignatureComparator:
         """
 
 
-        if not os.path.isfile(img_path):
-            return False, f"El archivo no existe: {img_path}"
-        
-        img  = cv2.imread(img_path)
+        img, error = self._load_image(img_path)
+        if img is False:
+            return False, error
 
         # 1) Detectar firma con YOLO/DETR
-        preds  = self.firma_detector_model.predict(img_path, conf=self.conf_doc, verbose=False)
+        preds  = self.firma_detector_model.predict(img, conf=self.conf_doc, verbose=False)
         boxes  = preds[0].boxes
         if len(boxes) == 0:
             return False, "No se detectó firma en Reverso de Factura"
@@ -230,31 +270,32 @@ class SignatureComparator:
         roi = img[y1:y2, x1:x2]
 
         # Visualización opcional
+        save_path = None
         if self.save_signature_factura:
             roi_rgb = cv2.cvtColor(roi, cv2.COLOR_BGR2RGB)
 
             # Save the image in the staging folder
-            base_name = os.path.splitext(os.path.basename(img_path))[0]
             save_path = os.path.join(self.staging_signatues_path, f"firma_factura.jpg")
             cv2.imwrite(save_path, cv2.cvtColor(roi_rgb, cv2.COLOR_RGB2BGR))
 
         return roi, save_path
     
     # -------------------- 3. Firma en la INE ---------------------- #
-    def _extract_tarjeta_signature(self, img_path: str) -> Tuple[np.ndarray, str]:
+    def _extract_tarjeta_signature(self, img_path: Union[np.ndarray, str]) -> Tuple[np.ndarray, str]:
         """
         Detects and crops the signature from an INE image.
 
         Parameters
         ----------
-        img_path : str
-            Path to the INE image.
+        img_path : np.ndarray or str
+            Tarjeta image (BGR array) or path to it.
 
         Returns
         -------
         Tuple[np.ndarray, str]
             - Cropped signature region as a NumPy array.
-            - Path where the signature image was saved (only if save_signature_ine is True).
+            - Path where the signature image was saved (only if save_signature_ine is True,
+              None otherwise).
 
         Raises
         ------
@@ -263,10 +304,9 @@ class SignatureComparator:
         """
 
 
-        if not os.path.isfile(img_path):
-            return False, f"El archivo no existe: {img_path}"
-
-        img  = cv2.imread(img_path)
+        img, error = self._load_image(img_path)
+        if img is False:
+            return False, error
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
         # 1) Aislar credencial
@@ -291,11 +331,11 @@ class SignatureComparator:
         roi = ine_crop[y1:y2, x1:x2]
 
         # Visualización opcional
+        save_path = None
         if self.save_signature_ine:
             roi_rgb = cv2.cvtColor(roi, cv2.COLOR_BGR2RGB)
 
             # Save the image in the staging folder
-            base_name = os.path.splitext(os.path.basename(img_path))[0]
             save_path = os.path.join(self.staging_signatues_path, f"firma_tarjeta.jpg")
             cv2.imwrite(save_path, cv2.cvtColor(roi_rgb, cv2.COLOR_RGB2BGR))
 
@@ -364,16 +404,16 @@ class SignatureComparator:
         return score, is_match
 
     # -------------------- 4. Comparación final -------------------- #
-    def compare_ine_factura(self, ine_img_path: str, doc_img_path: str) -> Tuple[Dict[str, float], str, str]:
+    def compare_ine_factura(self, ine_img_path: Union[np.ndarray, str], doc_img_path: Union[np.ndarray, str]) -> Tuple[Dict[str, float], str, str]:
         """
         Runs the entire pipeline to detect and compare signatures.
 
         Parameters
         ----------
-        ine_img_path : str
-            Path to the INE image.
-        doc_img_path : str
-            Path to the document image.
+        ine_img_path : np.ndarray or str
+            INE image (BGR array) or path to it.
+        doc_img_path : np.ndarray or str
+            Document image (BGR array) or path to it.
 
         Returns
         -------
@@ -404,16 +444,16 @@ class SignatureComparator:
 
 
 
-    def compare_ine_tarjeta(self, ine_img_path: str, doc_img_path: str) -> Tuple[Dict[str, float], str, str]:
+    def compare_ine_tarjeta(self, ine_img_path: Union[np.ndarray, str], doc_img_path: Union[np.ndarray, str]) -> Tuple[Dict[str, float], str, str]:
         """
         Runs the entire pipeline to detect and compare signatures.
 
         Parameters
         ----------
-        ine_img_path : str
-            Path to the INE image.
-        doc_img_path : str
-            Path to the document image.
+        ine_img_path : np.ndarray or str
+            INE image (BGR array) or path to it.
+        doc_img_path : np.ndarray or str
+            Document image (BGR array) or path to it.
 
         Returns
         -------
@@ -58,9 +58,9 @@ class SignatureStampValidator:
                 - bool: True if signature is present, False otherwise.
                 - str: Message indicating validation result.
         """
-        factura_jpg_path = self.pipe.make_jpg(self.factura_path)
-        
-        roi, path_mess = self.pipe._extract_factura_signature(factura_jpg_path)
+        factura_img = self.pipe.make_image(self.factura_path)
+
+        roi, path_mess = self.pipe._extract_factura_signature(factura_img)
         
         if roi is not False:
             return True, 'Firma detectada en Reverso de Factura'
@@ -81,10 +81,10 @@ class SignatureStampValidator:
                 - str or None: Path to saved INE signature image if available.
                 - str or None: Path to saved factura signature image if available.
         """
-        ine_jpg_path = self.pipe.make_jpg(self.ine_path)
-        factura_jpg_path = self.pipe.make_jpg(self.factura_path)
+        ine_img = self.pipe.make_image(self.ine_path)
+        factura_img = self.pipe.make_image(self.factura_path)
 
-        result, ine_save_path, factura_save_path = self.pipe.compare_ine_factura(ine_jpg_path, factura_jpg_path)
+        result, ine_save_path, factura_save_path = self.pipe.compare_ine_factura(ine_img, factura_img)
 
         if result is not False:
             if result['match'] == True:
@@ -112,10 +112,10 @@ class SignatureStampValidator:
                 - str or None: Path to saved signature image (INE or tarjeta) if available.
                 - str or None: Second image path if available (only when validation fails).
         """
-        ine_jpg_path = self.pipe.make_jpg(self.ine_path)
-        tarjeta_jpg_path = self.pipe.make_jpg(self.tarjeta_path)
+        ine_img = self.pipe.make_image(self.ine_path)
+        tarjeta_img = self.pipe.make_image(self.tarjeta_path)
 
-        result, ine_save_path, tarjeta_save_path = self.pipe.compare_ine_tarjeta(ine_jpg_path, tarjeta_jpg_path)
+        result, ine_save_path, tarjeta_save_path = self.pipe.compare_ine_tarjeta(ine_img, tarjeta_img)
 
         if result is not False:
             if result['match'] == True:
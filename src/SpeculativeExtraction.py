@@ -0,0 +1,224 @@
+import os
+import json
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from CFDIParser import find_cfdi
+from CaseProcessing import ensure_full_text
+from DataExtraction import INEDataExtractor, FacturaDataExtractor, FacturaReversoDataExtractor, TarjetCirculacionDataExtractor
+from RateLimiter import PRIORITY_BACKGROUND, llm_priority
+
+# Session key of the extracted data of each document type
+EXTRACTION_KEYS = {
+    "FACTURA": "datos_factura",
+    "FACTURA REVERSO": "datos_factura_reverso",
+    "INE": "datos_ine",
+    "TARJETA CIRCULACION": "datos_tarjeta",
+}
+
+
+def speculative_enabled():
+    return os.getenv("SPECULATIVE_EXTRACTION", "1") != "0"
+
+
+def _text(doc_info):
+    return "\n".join(doc_info["text"]) if doc_info and doc_info.get("text") else None
+
+
+class SpeculativeExtractor:
+    """
+    Extracts the data of a case in the background while the reviewer checks the
+    classification, so the results are ready when it is approved.
+
+    Each result is keyed by (file hash, document type, inputs digest); the inputs
+    digest covers the other data the extractor receives (the CFDI XML files for the
+    factura, the reverso for the INE). A result is reused only if its key is unchanged at approval,
+    so a reclassified document is never served a result computed for its old type.
+
+    Attributes:
+        api_key (str): API key for Gemini.
+    """
+
+    def __init__(self, api_key, max_workers=2):
+        self.api_key = api_key
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative")
+        self._futures = {}  # key -> Future of (datos, compactación)
+        self._digests = {}  # (path, size, mtime) -> sha256
+        self._full_texts = {}  # sha256 -> full-resolution text lines
+        self._reading = {}  # sha256 -> Event set when its background OCR ends
+        self._lock = threading.Lock()
+
+    def _file_digest(self, path):
+        stat = os.stat(path)
+        cache_key = (path, stat.st_size, stat.st_mtime_ns)
+        if cache_key not in self._digests:
+            sha = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    sha.update(block)
+            self._digests[cache_key] = sha.hexdigest()
+        return self._digests[cache_key]
+
+    def plan(self, documents, cfdi_paths=None):
+        """
+        Lists the extractions a case needs, with their keys.
+
+        Args:
+            documents (dict): Classified documents, as stored in the session.
+            cfdi_paths (list of str, optional): CFDI XML files of the case.
+
+        Returns:
+            dict: Maps each session key (e.g. 'datos_ine') to (key, document entry,
+            reverso entry or None).
+        """
+        by_type = {}
+        for doc_info in documents.values():
+            if os.path.exists(doc_info["filename"]):
+                by_type[doc_info["type"]] = doc_info
+
+        planned = {}
+        for doc_type, session_key in EXTRACTION_KEYS.items():
+            doc_info = by_type.get(doc_type)
+            if doc_info is None:
+                continue
+            reverso = by_type.get("INE REVERSO") if doc_type == "INE" else None
+            if doc_type == "FACTURA":
+                inputs = json.dumps(sorted(self._file_digest(path) for path in cfdi_paths or [] if os.path.exists(path)))
+            else:
+                inputs = self._file_digest(reverso["filename"]) if reverso else ""
+            key = (
+                self._file_digest(doc_info["filename"]),
+                doc_type,
+                hashlib.sha256(inputs.encode("utf-8")).hexdigest(),
+            )
+            planned[session_key] = (key, doc_info, reverso)
+        return planned
+
+    def _extract(self, doc_type, doc_info, reverso, cfdi_paths, digests):
+        # Copies, so the session entries are only updated by the approval step
+        documents = [dict(doc_info)] + ([dict(reverso)] if reverso else [])
+        with self._lock:
+            reading = {digest: self._reading.setdefault(digest, threading.Event()) for digest in digests}
+        try:
+            ensure_full_text(documents)
+            # The full text is kept so the approval step does not OCR the pages again
+            with self._lock:
+                for document, digest in zip(documents, digests):
+                    if document.get("text_level") == "full":
+                        self._full_texts[digest] = document["text"]
+        finally:
+            with self._lock:
+                for digest, event in reading.items():
+                    event.set()
+                    if self._reading.get(digest) is event:
+                        del self._reading[digest]
+        texto = _text(documents[0])
+        if doc_type == "FACTURA":
+            extractor = FacturaDataExtractor(texto, self.api_key, datos_cfdi=find_cfdi(cfdi_paths or [], texto))
+        elif doc_type == "FACTURA REVERSO":
+            extractor = FacturaReversoDataExtractor(texto, self.api_key)
+        elif doc_type == "INE":
+            extractor = INEDataExtractor(texto, self.api_key, texto_reverso=_text(documents[1]) if reverso else None)
+        else:
+            extractor = TarjetCirculacionDataExtractor(texto, self.api_key)
+        # Requests of the reviewer go ahead of these in the rate limiter
+        with llm_priority(PRIORITY_BACKGROUND):
+            return extractor.extraer_datos(), extractor.compactacion
+
+    def start(self, documents, cfdi_paths=None):
+        """
+        Starts the extractions of the case that are not running or done yet.
+
+        Args:
+            documents (dict): Classified documents, as stored in the session.
+            cfdi_paths (list of str, optional): CFDI XML files of the case.
+        """
+        for key, doc_info, reverso in self.plan(documents, cfdi_paths).values():
+            digests = [key[0]] + ([self._file_digest(reverso["filename"])] if reverso else [])
+            with self._lock:
+                if key not in self._futures:
+                    self._futures[key] = self._executor.submit(
+                        contextvars.copy_context().run, self._extract, key[1], doc_info, reverso, cfdi_paths, digests
+                    )
+
+    def apply_full_text(self, documents):
+        """
+        Gives the documents still at preview level the full text read for them in the
+        background, waiting for the pages the background is still reading.
+
+        Args:
+            documents (iterable of dict): Classified document entries. Updated in place.
+        """
+        for doc_info in documents:
+            if doc_info.get("text_level") != "preview" or not os.path.exists(doc_info["filename"]):
+                continue
+            digest = self._file_digest(doc_info["filename"])
+            with self._lock:
+                reading = self._reading.get(digest)
+            if reading is not None:
+                reading.wait()
+            with self._lock:
+                text = self._full_texts.get(digest)
+            if text is not None:
+                doc_info["text"] = text
+                doc_info["text_level"] = "full"
+
+    def discard(self, path):
+        """
+        Drops the results computed for a document, e.g. before it is reclassified.
+
+        Args:
+            path (str): Path of the document.
+        """
+        if not os.path.exists(path):
+            return
+        digest = self._file_digest(path)
+        with self._lock:
+            for key in [key for key in self._futures if key[0] == digest]:
+                self._futures.pop(key).cancel()
+
+    def collect(self, documents, cfdi_paths=None, grace=None):
+        """
+        Splits the extractions whose key still matches the approved classification into
+        finished ones and ones still running.
+
+        Extractions about to finish get `grace` seconds. Those that have not started
+        are cancelled, to be run again in the foreground; those running are returned so
+        the caller awaits them instead of sending the same request twice.
+
+        Args:
+            documents (dict): Classified documents, as approved.
+            cfdi_paths (list of str, optional): CFDI XML files of the case.
+            grace (float, optional): Seconds to wait for running extractions. Defaults
+                to SPECULATIVE_GRACE or 2.
+
+        Returns:
+            tuple: (dict mapping each session key to (datos, compactación) of finished
+            extractions, dict mapping each session key to the future of a running one).
+            Failed or cancelled extractions are left out, to be run again.
+        """
+        if grace is None:
+            grace = float(os.getenv("SPECULATIVE_GRACE", "2"))
+        with self._lock:
+            futures = {
+                session_key: (key, self._futures[key])
+                for session_key, (key, _, _) in self.plan(documents, cfdi_paths).items()
+                if key in self._futures
+            }
+        wait([future for _, future in futures.values()], timeout=grace)
+
+        terminados, en_curso = {}, {}
+        for session_key, (key, future) in futures.items():
+            if not future.done() and future.cancel():
+                with self._lock:
+                    self._futures.pop(key, None)
+            elif not future.done():
+                en_curso[session_key] = future
+            elif not future.cancelled() and future.exception() is None:
+                terminados[session_key] = future.result()
+        return terminados, en_curso
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
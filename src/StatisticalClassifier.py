@@ -0,0 +1,283 @@
+import os
+import re
+import json
+import zlib
+import zipfile
+import argparse
+import tempfile
+
+import numpy as np
+
+from DocumentClassification import DOCUMENT_TYPES
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(__file__), "models", "document_classifier.npz")
+
+
+class HashingVectorizer:
+    """
+    Turns OCR lines into fixed-size feature vectors without keeping a vocabulary.
+
+    Each document is represented by hashed word unigrams and character 3- and
+    4-grams of every word, with log-scaled counts and L2 normalization. Character
+    n-grams make the features robust to the small OCR errors of scanned documents.
+
+    Attributes:
+        n_features (int): Size of the hashed feature space.
+    """
+
+    def __init__(self, n_features=2 ** 14):
+        """
+        Initializes the vectorizer.
+
+        Args:
+            n_features (int): Size of the hashed feature space.
+        """
+        self.n_features = n_features
+
+    @staticmethod
+    def _features(lines):
+        for line in lines:
+            for word in re.findall(r"\w+", line.upper()):
+                yield "w:" + word
+                padded = f"<{word}>"
+                for n in (3, 4):
+                    for i in range(len(padded) - n + 1):
+                        yield "c:" + padded[i:i + n]
+
+    def transform(self, list_of_ocr_results):
+        """
+        Vectorizes a batch of documents.
+
+        Args:
+            list_of_ocr_results (list of list of str): OCR lines, one list per document.
+
+        Returns:
+            np.ndarray: Matrix of shape (n_documents, n_features), float32.
+        """
+        X = np.zeros((len(list_of_ocr_results), self.n_features), dtype=np.float32)
+        for row, lines in enumerate(list_of_ocr_results):
+            # crc32 is stable across processes, unlike the built-in hash()
+            for feature in self._features(lines):
+                X[row, zlib.crc32(feature.encode("utf-8")) % self.n_features] += 1
+        np.log1p(X, out=X)
+        norms = np.linalg.norm(X, axis=1, keepdims=True)
+        np.divide(X, norms, out=X, where=norms > 0)
+        return X
+
+
+class StatisticalClassifier:
+    """
+    Linear (softmax regression) document classifier over hashed text features.
+
+    The model is stored as a small .npz file and a whole batch of documents is
+    classified with a single matrix multiplication.
+
+    Attributes:
+        classes (list of str): Document types, in the order of the model columns.
+        vectorizer (HashingVectorizer): Feature extractor.
+        weights (np.ndarray): Weight matrix of shape (n_features, n_classes).
+        bias (np.ndarray): Bias vector of shape (n_classes,).
+    """
+
+    def __init__(self, classes, weights, bias, n_features):
+        self.classes = list(classes)
+        self.vectorizer = HashingVectorizer(n_features)
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+
+    @staticmethod
+    def _softmax(logits):
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    @classmethod
+    def train(cls, list_of_ocr_results, labels, n_features=2 ** 14, epochs=300, learning_rate=0.5, l2=1e-4):
+        """
+        Trains the model with full-batch gradient descent.
+
+        Args:
+            list_of_ocr_results (list of list of str): OCR lines, one list per document.
+            labels (list of str): Document type of each document.
+            n_features (int): Size of the hashed feature space.
+            epochs (int): Number of gradient descent iterations.
+            learning_rate (float): Gradient descent step size.
+            l2 (float): L2 regularization strength.
+
+        Returns:
+            StatisticalClassifier: The trained model.
+        """
+        classes = sorted(set(labels))
+        X = HashingVectorizer(n_features).transform(list_of_ocr_results)
+        Y = np.zeros((len(labels), len(classes)), dtype=np.float32)
+        Y[np.arange(len(labels)), [classes.index(label) for label in labels]] = 1
+
+        weights = np.zeros((n_features, len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        for _ in range(epochs):
+            error = (cls._softmax(X @ weights + bias) - Y) / len(labels)
+            weights -= learning_rate * (X.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+
+        return cls(classes, weights, bias, n_features)
+
+    def predict_proba(self, list_of_ocr_results):
+        """
+        Returns the probability of every document type for a batch of documents.
+
+        Args:
+            list_of_ocr_results (list of list of str): OCR lines, one list per document.
+
+        Returns:
+            np.ndarray: Matrix of shape (n_documents, n_classes).
+        """
+        X = self.vectorizer.transform(list_of_ocr_results)
+        return self._softmax(X @ self.weights + self.bias)
+
+    def classify_batch(self, list_of_ocr_results):
+        """
+        Classifies a batch of documents.
+
+        Args:
+            list_of_ocr_results (list of list of str): OCR lines, one list per document.
+
+        Returns:
+            list of tuple: (document type, probability) for each document, in order.
+        """
+        if not list_of_ocr_results:
+            return []
+        proba = self.predict_proba(list_of_ocr_results)
+        best = proba.argmax(axis=1)
+        return [(self.classes[i], float(proba[row, i])) for row, i in enumerate(best)]
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        """
+        Stores the model as a compressed .npz file (weights as float16).
+
+        Args:
+            path (str): Destination file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(
+            path,
+            classes=np.array(self.classes),
+            weights=self.weights.astype(np.float16),
+            bias=self.bias,
+            n_features=np.array(self.vectorizer.n_features),
+        )
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        """
+        Loads a model stored with `save`.
+
+        Args:
+            path (str): Model file.
+
+        Returns:
+            StatisticalClassifier: The loaded model.
+        """
+        with np.load(path) as data:
+            return cls(data["classes"].tolist(), data["weights"], data["bias"], int(data["n_features"]))
+
+
+_model = None
+
+
+def get_statistical_classifier(path=None):
+    """
+    Returns the process-wide model, loading it on first use.
+
+    Args:
+        path (str, optional): Model file. Defaults to STATISTICAL_CLASSIFIER_PATH or
+            models/document_classifier.npz.
+
+    Returns:
+        StatisticalClassifier or None: The model, or None if the file does not exist.
+    """
+    global _model
+    if _model is None:
+        path = path or os.getenv("STATISTICAL_CLASSIFIER_PATH") or DEFAULT_MODEL_PATH
+        if not os.path.isfile(path):
+            return None
+        _model = StatisticalClassifier.load(path)
+    return _model
+
+
+def _label_from_filename(filename, labels):
+    """
+    Returns the label of a PDF from the labels mapping or from the '_<TYPE>.pdf'
+    suffix that the application adds after a reviewed classification.
+    """
+    if filename in labels:
+        return labels[filename]
+    stem = os.path.splitext(filename)[0]
+    for doc_type in DOCUMENT_TYPES:
+        if stem.endswith("_" + doc_type):
+            return doc_type
+    return None
+
+
+def iter_labeled_pdfs(paths, labels=None):
+    """
+    Yields the labeled PDFs of case folders or case zips such as data/Caso *.zip.
+
+    Files are labeled by the `labels` mapping (file name to document type) or by the
+    '_<TYPE>.pdf' suffix. Unlabeled files are skipped.
+
+    Args:
+        paths (list of str): Case folders or .zip files.
+        labels (dict, optional): Maps PDF file names to document types.
+
+    Yields:
+        tuple: (path to the PDF, document type).
+    """
+    labels = labels or {}
+    for path in paths:
+        if zipfile.is_zipfile(path):
+            extract_dir = tempfile.mkdtemp(prefix="autoavanza_")
+            with zipfile.ZipFile(path) as zip_ref:
+                zip_ref.extractall(extract_dir)
+            path = extract_dir
+
+        for root, _, filenames in os.walk(path):
+            if "__MACOSX" in root:
+                continue
+            for filename in filenames:
+                if not filename.lower().endswith(".pdf"):
+                    continue
+                label = _label_from_filename(filename, labels)
+                if label is not None:
+                    yield os.path.join(root, filename), label
+
+
+def main():
+    from CaseProcessing import classify_document
+
+    parser = argparse.ArgumentParser(description="Entrena el clasificador estadístico de documentos.")
+    parser.add_argument("paths", nargs="+", help="Carpetas o archivos .zip de casos")
+    parser.add_argument("--labels", help="JSON que asigna el tipo de documento a cada nombre de archivo")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH, help="Archivo .npz de salida")
+    args = parser.parse_args()
+
+    labels = {}
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as labels_file:
+            labels = json.load(labels_file)
+
+    texts, targets = [], []
+    for pdf_path, label in iter_labeled_pdfs(args.paths, labels):
+        texts.append(classify_document(pdf_path)["text"])
+        targets.append(label)
+
+    if not texts:
+        raise SystemExit("No se encontraron documentos etiquetados.")
+
+    model = StatisticalClassifier.train(texts, targets)
+    model.save(args.output)
+    accuracy = np.mean([doc_type == label for (doc_type, _), label in zip(model.classify_batch(texts), targets)])
+    print(f"{len(texts)} documentos, precisión de entrenamiento {accuracy:.1%}, modelo guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+class TextLayerExtractor:
+    """
+    Reads the embedded text layer of digitally generated PDFs (e.g. CFDI facturas
+    printed from the issuer's system), so they can skip rasterization and OCR.
+
+    A page is considered usable when it has enough characters and its text blocks
+    cover a minimum fraction of the page; scanned pages usually have no text layer
+    or only a few stray words and fall back to OCR.
+
+    Attributes:
+        min_chars (int): Minimum number of non-whitespace characters on the page.
+        min_coverage (float): Minimum ratio between text-block area and page area.
+    """
+
+    def __init__(self, min_chars=200, min_coverage=0.05):
+        """
+        Initializes the TextLayerExtractor.
+
+        Args:
+            min_chars (int): Minimum number of non-whitespace characters on the page.
+            min_coverage (float): Minimum ratio between text-block area and page area.
+        """
+        import fitz  # PyMuPDF
+        self._fitz = fitz
+        self.min_chars = min_chars
+        self.min_coverage = min_coverage
+
+    @staticmethod
+    def text_coverage(page):
+        """
+        Computes the fraction of the page area covered by text blocks.
+
+        Args:
+            page (fitz.Page): Page to measure.
+
+        Returns:
+            float: Ratio between 0 and 1.
+        """
+        page_area = page.rect.width * page.rect.height
+        if page_area <= 0:
+            return 0.0
+
+        text_area = 0.0
+        for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks"):
+            if block_type == 0 and text.strip():
+                text_area += max(0.0, x1 - x0) * max(0.0, y1 - y0)
+        return min(1.0, text_area / page_area)
+
+    def extract(self, pdf_path, page=0):
+        """
+        Returns the lines of the page text layer, in the same shape as OCR results.
+
+        Args:
+            pdf_path (str): Path to the PDF file.
+            page (int): Zero-based index of the page to read.
+
+        Returns:
+            list of str or None: Non-empty text lines, or None if the page has no
+            usable text layer and must go through OCR.
+        """
+        with self._fitz.open(pdf_path) as doc:
+            if page >= doc.page_count:
+                return None
+            pdf_page = doc[page]
+            text = pdf_page.get_text("text")
+
+            if sum(1 for char in text if not char.isspace()) < self.min_chars:
+                return None
+            if self.text_coverage(pdf_page) < self.min_coverage:
+                return None
+
+        return [line.strip() for line in text.splitlines() if line.strip()]
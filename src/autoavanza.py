@@ -16,14 +16,16 @@ from selenium.common.exceptions import WebDriverException
 from dateutil.parser import parse
 
 
-from OCR import TextExtractor
-from DocumentClassification import DocumentClassifier
+from CaseProcessing import classify_documents, ensure_full_text
+from CFDIParser import find_cfdi
 from Staging import Staging
 from QRExctraction import CFDIValidator
-from DataExtraction import INEDataExtractor, FacturaDataExtractor, FacturaReversoDataExtractor, TarjetCirculacionDataExtractor
+from DataExtraction import BaseDataExtractor, INEDataExtractor, FacturaDataExtractor, FacturaReversoDataExtractor, TarjetCirculacionDataExtractor
 from DataValidation import DataValidator
 from SignatureStampValidation import SignatureStampValidator
 from Ruling import RulingMaker
+from SpeculativeExtraction import SpeculativeExtractor, speculative_enabled
+from RateLimiter import TokenUsage, set_case_usage
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
@@ -59,23 +61,26 @@ def decompress_zip(zip_file):
 
     return staging_path
 
-def process_and_classify(directory):
+def process_and_classify(directory, parallel=None):
     classified_documents = {}
+    pdf_paths = []
+    xml_paths = []
     for folder in os.listdir(directory):
         if folder not in ['.DS_Store', '__MACOSX']:
             for filename in os.listdir(os.path.join(directory, folder)):
                 if filename.endswith(".pdf") and filename != '.DS_Store':
-                    pdf_path = os.path.join(directory, folder, filename)
-                    data_extractor = TextExtractor()
-                    image_path = data_extractor.convert_pdf_to_image(pdf_path)
-                    results = data_extractor.image_to_text(image_path)
-                    # data_extractor.delete_image(image_path)
-                    document_classifier = DocumentClassifier(image_path, results)
-                    new_file_name, document = document_classifier.classify()
-                    os.rename(pdf_path, new_file_name)
-                    os.remove(image_path)
-                    classified_documents[os.path.basename(new_file_name)] = {"type": document, "filename": new_file_name, "text": results}
-    return classified_documents
+                    pdf_paths.append(os.path.join(directory, folder, filename))
+                elif filename.lower().endswith(".xml"):
+                    xml_paths.append(os.path.join(directory, folder, filename))
+
+    for pdf_path, result in classify_documents(pdf_paths, parallel=parallel).items():
+        new_file_name = result["new_name"]
+        os.rename(pdf_path, new_file_name)
+        classified_documents[os.path.basename(new_file_name)] = {"type": result["type"], "filename": new_file_name, "text": result["text"], "text_level": result["text_level"], "confidence": result["confidence"], "error": result["error"]}
+
+    # The CFDI XML of the factura, when included, gives its fiscal data exactly; it is
+    # read once the factura text is final, to check that it belongs to this factura
+    return classified_documents, xml_paths
 
 
 def get_file_hash(file):
@@ -193,6 +198,11 @@ uploaded_file = st.file_uploader("Subir un archivo ZIP que contenga los document
 if uploaded_file is not None:
     file_hash = get_file_hash(uploaded_file)
 
+    # Tokens of the Gemini calls of each case, shown with the ruling
+    if st.session_state.get("last_file_hash") != file_hash or "token_usage" not in st.session_state:
+        st.session_state.token_usage = TokenUsage()
+    set_case_usage(st.session_state.token_usage)
+
     if st.session_state.get("last_file_hash") != file_hash:
         st.session_state.last_file_hash = file_hash
         directory = decompress_zip(uploaded_file)
@@ -200,7 +210,14 @@ if uploaded_file is not None:
 
         # ---------------------------  Classify documents  --------------------------- #
 
-        st.session_state.classified_documents_data = process_and_classify(directory)
+        st.session_state.classified_documents_data, st.session_state.cfdi_paths = process_and_classify(directory)
+
+        # Data extraction starts in the background while the classification is reviewed
+        if "speculative" in st.session_state:
+            st.session_state.speculative.shutdown()
+            del st.session_state.speculative
+        if speculative_enabled():
+            st.session_state.speculative = SpeculativeExtractor(GEMINI_API_KEY)
 
     classified_documents_data = st.session_state.get("classified_documents_data", {})
 
@@ -225,7 +242,6 @@ if uploaded_file is not None:
         for item_key, doc_info in sorted_documents_list:
             current_filename = doc_info["filename"]
             current_type = doc_info["type"]
-            current_text = doc_info["text"]
             base_filename = os.path.basename(current_filename)
 
             if not os.path.exists(current_filename):
@@ -233,6 +249,11 @@ if uploaded_file is not None:
                 continue
 
             with st.expander(f"{current_type}", expanded=False):
+                if doc_info.get("error"):
+                    st.error(f"⚠️ {doc_info['error']}")
+                elif "confidence" in doc_info:
+                    st.caption(f"Confianza de clasificación: {doc_info['confidence']:.0%}")
+
                 if os.path.exists(current_filename):
                     pdf_viewer(current_filename)
                 else:
@@ -248,15 +269,18 @@ if uploaded_file is not None:
 
                 if st.button("💾 Guardar Cambios", key=f"save_{base_filename}"):
                     if selected_type != current_type:
+                        # The background result computed for the old type is dropped
+                        if "speculative" in st.session_state:
+                            st.session_state.speculative.discard(current_filename)
                         new_filename = os.path.join(os.path.dirname(current_filename), base_filename.replace(current_type, selected_type))
                         os.rename(current_filename, new_filename)
                         st.success(f"Archivo renombrado a: {os.path.basename(new_filename)}")
-                        updated_documents_data[item_key] = {"type": selected_type, "filename": new_filename, "text": current_text}
+                        updated_documents_data[item_key] = {**doc_info, "type": selected_type, "filename": new_filename}
                     else:
-                        updated_documents_data[item_key] = {"type": current_type, "filename": current_filename, "text": current_text}
+                        updated_documents_data[item_key] = dict(doc_info)
                         st.info("No se realizaron cambios.")
                 else:
-                    updated_documents_data[item_key] = {"type": current_type, "filename": current_filename, "text": current_text}
+                    updated_documents_data[item_key] = dict(doc_info)
 
                 if os.path.exists(current_filename):
                     with open(current_filename, "rb") as pdf_file:
@@ -272,11 +296,25 @@ if uploaded_file is not None:
         # Update the session state with the potentially renamed files
         st.session_state.classified_documents_data.update(updated_documents_data)
 
+        # Only documents without a background extraction yet (e.g. just reclassified) start one
+        if "speculative" in st.session_state:
+            st.session_state.speculative.start(st.session_state.classified_documents_data, st.session_state.get("cfdi_paths"))
+
         if not has_revisar_type(st.session_state.classified_documents_data):
             if st.button("✅ Apruebo clasificación, continuar con extracción de datos", key="aprobacion_clasificacion"):
                 factura_file = None
                 document_files = {}
 
+                # Documents classified from the low-resolution pass get full OCR only now,
+                # unless the background extraction already read them
+                if "speculative" in st.session_state:
+                    st.session_state.speculative.apply_full_text(st.session_state.classified_documents_data.values())
+                with st.spinner("Extrayendo texto de los documentos..."):
+                    ensure_full_text(st.session_state.classified_documents_data.values())
+                for doc_info in st.session_state.classified_documents_data.values():
+                    if doc_info.get("text_level") == "preview" and doc_info.get("error"):
+                        st.warning(f"⚠️ {os.path.basename(doc_info['filename'])}: {doc_info['error']}. Se usará el texto de baja resolución.")
+
                 for doc_info in st.session_state.classified_documents_data.values():
                     doc_type = doc_info["type"]
                     filename = doc_info["filename"]
@@ -310,38 +348,91 @@ if uploaded_file is not None:
                 datos_tarjeta = None
 
 
+                extractors = {}
+
                 if factura_file and os.path.exists(factura_file):
                     input_message = '\n'.join(factura_text)
-                    factura_data_extractor = FacturaDataExtractor(input_message, GEMINI_API_KEY)
-                    st.session_state.datos_factura = factura_data_extractor.extraer_datos()
-
+                    extractors["datos_factura"] = FacturaDataExtractor(
+                        input_message, GEMINI_API_KEY, datos_cfdi=find_cfdi(st.session_state.get("cfdi_paths", []), input_message)
+                    )
                 else:
                     st.error("⚠️ No se encontró ningún archivo clasificado como FACTURA.")
 
                 
                 if factura_reverso_file and os.path.exists(factura_reverso_file):
                     input_message = '\n'.join(factura_reverso_text)
-                    factura_data_extractor = FacturaReversoDataExtractor(input_message, GEMINI_API_KEY)
-                    st.session_state.datos_factura_reverso = factura_data_extractor.extraer_datos()
+                    extractors["datos_factura_reverso"] = FacturaReversoDataExtractor(input_message, GEMINI_API_KEY)
                 else:
                     st.error("⚠️ No se encontró ningún archivo clasificado como FACTURA REVERSO.")
 
                 
                 if ine_file and os.path.exists(ine_file):
                     input_message = '\n'.join(ine_text)
-                    ine_data_extractor = INEDataExtractor(input_message, GEMINI_API_KEY)
-                    st.session_state.datos_ine = ine_data_extractor.extraer_datos()
+                    # The MRZ of the reverso gives the name and dates without the LLM
+                    texto_reverso = '\n'.join(ine_reverso_text) if ine_reverso_text else None
+                    extractors["datos_ine"] = INEDataExtractor(input_message, GEMINI_API_KEY, texto_reverso=texto_reverso)
                 else:
                     st.error("⚠️ No se encontró ningún archivo clasificado como INE.")
 
                 
                 if tarjeta_circulacion_file and os.path.exists(tarjeta_circulacion_file):
                     input_message = '\n'.join(tarjeta_circulacion_text)
-                    tarjeta_data_extractor = TarjetCirculacionDataExtractor(input_message, GEMINI_API_KEY)
-                    st.session_state.datos_tarjeta = tarjeta_data_extractor.extraer_datos()
+                    extractors["datos_tarjeta"] = TarjetCirculacionDataExtractor(input_message, GEMINI_API_KEY)
                 else:
                     st.error("⚠️ No se encontró ningún archivo clasificado como TARJETA CIRCULACION.")
 
+                # All Gemini requests run at the same time; each document's fields are shown
+                # (read-only) as they arrive and become editable once the extraction ends
+                titulos = {
+                    "datos_factura": "📄 Datos de la Factura",
+                    "datos_factura_reverso": "📄 Datos del Reverso de la Factura",
+                    "datos_ine": "🪪 Datos del INE",
+                    "datos_tarjeta": "🚗 Datos de la Tarjeta de Circulación",
+                }
+                placeholders = {key: st.empty() for key in extractors}
+                parciales = {key: {} for key in extractors}
+
+                # Results extracted in the background for the approved classification are
+                # reused, and the extractions still running are awaited, not repeated
+                compactaciones = []
+                en_curso = {}
+                if "speculative" in st.session_state:
+                    with st.spinner("Recuperando datos extraídos en segundo plano..."):
+                        terminados, en_curso = st.session_state.speculative.collect(
+                            st.session_state.classified_documents_data, st.session_state.get("cfdi_paths")
+                        )
+                    for key, (datos, compactacion) in terminados.items():
+                        if key in extractors:
+                            del extractors[key]
+                            st.session_state[key] = datos
+                            compactaciones.append(compactacion)
+                            placeholders[key].success(f"{titulos[key]}: {len(datos)} campos extraídos")
+                    en_curso = {key: future for key, future in en_curso.items() if key in extractors}
+                    for key in en_curso:
+                        del extractors[key]
+                        placeholders[key].info(f"{titulos[key]}: extracción en segundo plano en proceso")
+
+                with st.spinner("Extrayendo datos de los documentos..."):
+                    for kind, key, payload in BaseDataExtractor.extraer_datos_stream(extractors, en_curso=en_curso):
+                        if kind == "campos":
+                            parciales[key].update(payload)
+                            placeholders[key].markdown(
+                                f"**{titulos[key]}** (en proceso)\n\n"
+                                + "\n".join(f"- **{campo}**: {valor}" for campo, valor in parciales[key].items())
+                            )
+                        elif payload["error"]:
+                            placeholders[key].error(f"⚠️ {payload['error']} ({key})")
+                        else:
+                            st.session_state[key] = payload["datos"]
+                            compactaciones.append(payload["compactacion"])
+                            placeholders[key].success(f"{titulos[key]}: {len(payload['datos'])} campos extraídos")
+
+                compactaciones = [compactacion for compactacion in compactaciones if compactacion]
+                tokens_antes = sum(compactacion.tokens_before for compactacion in compactaciones)
+                tokens_despues = sum(compactacion.tokens_after for compactacion in compactaciones)
+                if tokens_antes:
+                    st.caption(f"Tokens de texto enviados a Gemini: {tokens_despues} de {tokens_antes} ({1 - tokens_despues / tokens_antes:.0%} menos)")
+
 
                 if factura_file and os.path.exists(factura_file):
                     validator = CFDIValidator(factura_file)
@@ -594,7 +685,11 @@ if uploaded_file is not None:
 
                                 if "response" not in st.session_state:
                                     ruler = RulingMaker(data_results_message, data_results_bool, sign_results_message, sign_results_bool, GEMINI_API_KEY)
-                                    st.session_state.response = ruler.obtener_dictamen()  # Only call once!
+                                    try:
+                                        st.session_state.response = ruler.obtener_dictamen()  # Only call once!
+                                    except Exception as e:
+                                        st.error(f"No se pudo generar el dictamen: {e}")
+                                        st.stop()
 
                                 pdf_path = ruler.generar_pdf_dictamen()
 
@@ -603,6 +698,13 @@ if uploaded_file is not None:
                                 df_total = ruler.return_table_dictamen()
                                 st.dataframe(df_total, use_container_width=True, hide_index=True, row_height=70)
 
+                                usage = st.session_state.get("token_usage")
+                                if usage and usage.requests:
+                                    st.caption(
+                                        f"Consumo de Gemini en este caso: {usage.requests} solicitudes, {usage.total_tokens} tokens "
+                                        f"({usage.prompt_tokens} de entrada, {usage.cached_tokens} en caché, {usage.output_tokens} de salida)"
+                                    )
+
 
                                 st.write(st.session_state.response)
 
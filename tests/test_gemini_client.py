@@ -0,0 +1,57 @@
+import pytest
+
+import GeminiClient
+import RateLimiter
+from MockGeminiServer import MockGeminiServer
+
+SYSTEM = "Eres un experto en facturas de vehículos."
+
+
+@pytest.fixture
+def server():
+    with MockGeminiServer() as server:
+        GeminiClient.set_transport(base_url=server.url)
+        yield server
+    GeminiClient.set_transport()
+
+
+def _record(server, text):
+    body = {
+        "systemInstruction": {"parts": [{"text": SYSTEM}]},
+        "contents": [{"role": "user", "parts": [{"text": "Texto de la factura"}]}],
+        "generationConfig": {},
+    }
+    server.recordings[MockGeminiServer.request_key(GeminiClient.GEMINI_MODEL, body)] = text
+
+
+def test_system_message_is_sent_as_system_instruction(server):
+    # The recording only matches if the prompt came apart from the input
+    _record(server, '{"Marca": "Nissan"}')
+    response = GeminiClient.generate_with_system("clave", SYSTEM, "Texto de la factura")
+    assert GeminiClient.response_text(response) == '{"Marca": "Nissan"}'
+    assert server.stats["recorded"] == 1
+
+
+def test_streamed_chunks_join_into_the_recorded_answer(server):
+    _record(server, '{"Marca": "Nissan", "Modelo": "Versa", "Año": "2020"}')
+    chunks = GeminiClient.generate_with_system("clave", SYSTEM, "Texto de la factura", stream=True)
+    assert "".join(GeminiClient.response_text(chunk) for chunk in chunks) == '{"Marca": "Nissan", "Modelo": "Versa", "Año": "2020"}'
+
+
+def test_usage_reported_by_the_server_is_accounted(server, monkeypatch):
+    limiter = RateLimiter.RateLimiter(rpm=0, tpm=100000)
+    settled = []
+    monkeypatch.setattr(limiter, "settle", lambda estimated, actual: settled.append(actual))
+    monkeypatch.setattr(GeminiClient, "get_rate_limiter", lambda: limiter)
+    usage = RateLimiter.TokenUsage()
+    RateLimiter.set_case_usage(usage)
+    try:
+        GeminiClient.generate_with_system("clave", SYSTEM, "Texto de la factura")
+        list(GeminiClient.generate_with_system("clave", SYSTEM, "Texto de la factura", stream=True))
+    finally:
+        RateLimiter.set_case_usage(None)
+
+    assert usage.requests == 2
+    assert usage.total_tokens == usage.prompt_tokens + usage.output_tokens > 0
+    # The estimates reserved before sending were corrected with the reported usage
+    assert sum(settled) == usage.total_tokens
@@ -0,0 +1,71 @@
+import json
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from MockGeminiServer import MockGeminiServer
+
+SYSTEM = {"parts": [{"text": "Eres un experto en documentos vehiculares. " * 20}]}
+CONTENTS = [{"role": "user", "parts": [{"text": "Texto del documento"}]}]
+
+
+def _request(url, body=None, method=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.read().decode("utf-8")
+
+
+def _status(url, body=None, method=None):
+    try:
+        _request(url, body, method)
+    except urllib.error.HTTPError as e:
+        return e.code
+    return 200
+
+
+@pytest.fixture
+def server():
+    with MockGeminiServer() as server:
+        yield server
+
+
+def test_stream_sends_the_answer_in_chunks_with_usage_at_the_end(server):
+    key = MockGeminiServer.request_key("gemini-2.0-flash", {"systemInstruction": SYSTEM, "contents": CONTENTS})
+    server.recordings[key] = '{"Marca": "Nissan", "Modelo": "Versa", "Año": "2020"}'
+    events = _request(
+        f"{server.url}/v1beta/models/gemini-2.0-flash:streamGenerateContent?alt=sse",
+        {"systemInstruction": SYSTEM, "contents": CONTENTS},
+    )
+    chunks = [json.loads(line[len("data: "):]) for line in events.splitlines() if line.startswith("data: ")]
+
+    assert len(chunks) > 1
+    assert "".join(chunk["candidates"][0]["content"]["parts"][0]["text"] for chunk in chunks) == server.recordings[key]
+    assert all("usageMetadata" not in chunk for chunk in chunks[:-1])
+    usage = chunks[-1]["usageMetadata"]
+    assert usage["totalTokenCount"] == usage["promptTokenCount"] + usage["candidatesTokenCount"] > 0
+    assert chunks[-1]["candidates"][0]["finishReason"] == "STOP"
+
+
+def test_cached_content_is_served_until_it_expires(server):
+    cached = json.loads(_request(f"{server.url}/v1beta/cachedContents", {"model": "models/gemini-2.0-flash", "systemInstruction": SYSTEM, "ttl": "1s"}))
+    cache_url = f"{server.url}/v1beta/{cached['name']}"
+    generate_url = f"{server.url}/v1beta/models/gemini-2.0-flash:generateContent"
+
+    assert json.loads(_request(cache_url))["name"] == cached["name"]
+    answer = json.loads(_request(generate_url, {"cachedContent": cached["name"], "contents": CONTENTS}))
+    usage = answer["usageMetadata"]
+    assert 0 < usage["cachedContentTokenCount"] < usage["promptTokenCount"]
+
+    time.sleep(1.1)
+    assert _status(cache_url) == 404
+    assert _status(generate_url, {"cachedContent": cached["name"], "contents": CONTENTS}) == 404
+
+
+def test_deleted_cached_content_is_not_found(server):
+    cached = json.loads(_request(f"{server.url}/v1beta/cachedContents", {"model": "models/gemini-2.0-flash", "systemInstruction": SYSTEM}))
+    cache_url = f"{server.url}/v1beta/{cached['name']}"
+    _request(cache_url, method="DELETE")
+    assert _status(cache_url) == 404
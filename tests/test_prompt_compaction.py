@@ -0,0 +1,35 @@
+import pytest
+
+from ExtractionSchemas import FACTURA_REVERSO_SCHEMA, FACTURA_SCHEMA, INE_SCHEMA, TARJETA_CIRCULACION_SCHEMA
+from PromptCompaction import FIELD_ANCHORS, FIELD_REGIONS, PromptCompactor
+
+TARJETA = "\n".join(
+    ["TARJETA DE CIRCULACIÓN", "SECRETARÍA DE MOVILIDAD", "CIUDAD DE MÉXICO", "FOLIO 123456", "VEHÍCULO PARTICULAR"]
+    + [f"DATO ADMINISTRATIVO {i} SIN RELACIÓN CON LOS CAMPOS" for i in range(30)]
+    + ["PROPIETARIO", "JUAN PÉREZ LÓPEZ", "DOMICILIO CONOCIDO"]
+    + [f"OTRO DATO {i} DEL REVERSO DEL DOCUMENTO" for i in range(30)]
+)
+
+
+@pytest.mark.parametrize("schema", [INE_SCHEMA, FACTURA_SCHEMA, FACTURA_REVERSO_SCHEMA, TARJETA_CIRCULACION_SCHEMA])
+def test_every_schema_field_has_anchors_and_a_region(schema):
+    for campo in schema.names:
+        assert FIELD_ANCHORS.get(campo), campo
+        assert FIELD_REGIONS.get(campo) in ("top", "middle", "bottom", "all"), campo
+
+
+def test_anchored_fields_keep_only_their_lines():
+    result = PromptCompactor().compact(TARJETA, ["Nombre del solicitante", "Estado o entidad federativa"])
+    assert result.anchored
+    assert "JUAN PÉREZ LÓPEZ" in result.text and "CIUDAD DE MÉXICO" in result.text
+    assert result.reduction > 0.6
+
+
+def test_unanchored_field_keeps_only_its_region():
+    result = PromptCompactor().compact(TARJETA, ["Nombre del solicitante", "Leyenda primera emisión"])
+    assert not result.anchored
+    # The bottom third is kept for the legend; the anchored name is still found
+    assert "JUAN PÉREZ LÓPEZ" in result.text
+    assert "OTRO DATO 29 DEL REVERSO DEL DOCUMENTO" in result.text
+    assert "DATO ADMINISTRATIVO 10 SIN RELACIÓN CON LOS CAMPOS" not in result.text
+    assert 0 < result.tokens_after < result.tokens_before
@@ -0,0 +1,88 @@
+import json
+import urllib.request
+
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from MockGeminiServer import MockGeminiServer
+from RateLimiter import RateLimiter
+from ResilientCall import CircuitBreaker, CircuitOpenError, QueueTimeout, ResilientCaller
+
+
+def _generate(url):
+    # urllib's HTTPError carries the status in `code`, like the genai errors
+    request = urllib.request.Request(
+        f"{url}/v1beta/models/gemini-2.0-flash:generateContent",
+        data=json.dumps({"contents": [{"role": "user", "parts": [{"text": "hola"}]}]}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.load(response)["candidates"][0]["content"]["parts"][0]["text"]
+
+
+def _caller(**kwargs):
+    settings = dict(timeout=5, deadline=10, max_retries=5, base_delay=0.01, max_delay=0.05)
+    settings.update(kwargs)
+    return ResilientCaller(**settings)
+
+
+def test_retries_injected_server_errors():
+    with MockGeminiServer(error_rate=0.5, seed=3) as server:
+        caller = _caller()
+        for _ in range(5):
+            assert caller.call(_generate, server.url)
+        assert server.stats["errors"] > 0
+        assert caller.breaker.state == "closed"
+
+
+def test_rate_limited_call_fails_after_retries():
+    with MockGeminiServer(rpm=2) as server:
+        caller = _caller(max_retries=2)
+        caller.call(_generate, server.url)
+        caller.call(_generate, server.url)
+        with pytest.raises(Exception) as error:
+            caller.call(_generate, server.url)
+        assert error.value.code == 429
+        assert server.stats["rate_limited"] == 3
+
+
+def test_circuit_opens_after_consecutive_failures():
+    with MockGeminiServer(rpm=1) as server:
+        caller = _caller(max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        caller.call(_generate, server.url)
+        for _ in range(2):
+            with pytest.raises(Exception):
+                caller.call(_generate, server.url)
+        requests = server.stats["requests"]
+        with pytest.raises(CircuitOpenError):
+            caller.call(_generate, server.url)
+        assert server.stats["requests"] == requests
+
+
+def test_hedged_request_discards_the_slower_answer():
+    with MockGeminiServer(latency=0.3) as server:
+        caller = _caller(hedge=True)
+        for _ in range(caller.latency.min_samples):
+            caller.latency.record(0.05)
+        discarded = []
+        assert caller.call(_generate, server.url, on_discard=discarded.append)
+        caller._executor.shutdown(wait=True)
+        assert server.stats["requests"] == 2
+        assert len(discarded) == 1
+        assert max(caller.latency._samples) < 0.5
+
+
+def test_rate_limiter_queueing_does_not_trip_the_breaker():
+    limiter = RateLimiter(rpm=30, tpm=0)
+    with MockGeminiServer() as server:
+        caller = _caller(timeout=2, deadline=1, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        acquire = lambda timeout: limiter.acquire(1, timeout=timeout)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(caller.call, _generate, server.url, acquire=acquire) for _ in range(40)]
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        # The turns of the minute are served; the rest run out of deadline in the queue
+        assert server.stats["requests"] >= 30
+        assert server.stats["requests"] + len(errors) == 40
+        assert all(isinstance(error, QueueTimeout) for error in errors)
+        assert caller.breaker.state == "closed"